@@ -0,0 +1,224 @@
+"""
+Benchmark the PO token providers of the plugin against a stub server and a fake JS runtime.
+
+Every token request reaches the stub (the plugin-side cache is disabled unless --cache is passed),
+so the numbers measure the overhead of the providers on top of a backend with a known latency.
+
+Usage: python benchmarks/bench_providers.py [--providers http,node,deno] [--concurrency 1,8] ...
+"""
+from __future__ import annotations
+
+import argparse
+import concurrent.futures
+import contextlib
+import json
+import os
+import signal
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, os.pardir, 'plugin'))
+
+from stub_server import StubServer, plugin_version
+from yt_dlp import YoutubeDL
+from yt_dlp.extractor.youtube.pot._director import YoutubeIEContentProviderLogger
+from yt_dlp.extractor.youtube.pot._registry import _pot_providers
+from yt_dlp.extractor.youtube.pot.provider import PoTokenContext, PoTokenRequest
+
+PROVIDER_KEYS = {
+    'http': 'BgUtilHTTP',
+    'node': 'BgUtilScriptNode',
+    'deno': 'BgUtilScriptDeno',
+}
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, round(pct / 100 * (len(values) - 1)))]
+
+
+def _cpu_time() -> float:
+    # includes the processes spawned by the script providers once they have been waited for
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+class Environment:
+    """Stub server, fake runtimes and a scratch server_home/cache directory shared by all runs"""
+
+    def __init__(self, args):
+        self.args = args
+        self.tmpdir = tempfile.TemporaryDirectory(prefix='bgutil-bench-')
+        self.server_home = os.path.join(self.tmpdir.name, 'server')
+        for script in ('build/generate_once.js', 'src/generate_once.ts', 'build/main.js', 'src/main.ts'):
+            os.makedirs(os.path.dirname(os.path.join(self.server_home, script)), exist_ok=True)
+            open(os.path.join(self.server_home, script), 'w').close()
+        os.environ.update({
+            'BGUTIL_BENCH_VERSION': plugin_version(),
+            'BGUTIL_BENCH_STARTUP': str(args.startup),
+            'BGUTIL_BENCH_LATENCY': str(args.latency),
+            # keep the probe cache of the benchmarks away from the real one
+            'XDG_CACHE_HOME': os.path.join(self.tmpdir.name, 'cache'),
+        })
+        self.runtimes = {runtime: self._make_runtime(runtime) for runtime in ('node', 'deno')}
+        self.server = StubServer(latency=args.latency).start()
+
+    def _make_runtime(self, runtime: str) -> str:
+        path = os.path.join(self.tmpdir.name, 'bin', runtime)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(
+                '#!/bin/sh\n'
+                f'PYTHONPATH="{BENCH_DIR}" exec "{sys.executable}" "{os.path.join(BENCH_DIR, "fake_jsrt.py")}" '
+                f'{runtime} "$@"\n')
+        os.chmod(path, 0o755)
+        return path
+
+    def make_provider(self, name: str):
+        settings = {'cache_size': ['1024' if self.args.cache else '0']}
+        params = {'quiet': True, 'no_warnings': True, 'js_runtimes': {
+            runtime: {'path': path} for runtime, path in self.runtimes.items()}}
+        if name == 'http':
+            settings['base_url'] = [self.server.base_url]
+        else:
+            params['extractor_args'] = {'youtubepot-bgutilscript': {
+                'server_home': [self.server_home],
+                'persistent': ['1' if self.args.persistent else '0'],
+                'daemon': ['1' if self.args.daemon else '0'],
+            }}
+        ydl = YoutubeDL(params)
+        ie = ydl.get_info_extractor('Youtube')
+        provider_cls = _pot_providers.value[PROVIDER_KEYS[name]]
+        logger = YoutubeIEContentProviderLogger(
+            ie, provider_cls.PROVIDER_NAME, log_level=YoutubeIEContentProviderLogger.LogLevel.ERROR)
+        return ydl, provider_cls(ie, logger, settings)
+
+    def close(self):
+        self.server.stop()
+        # the daemon outlives the providers until it is idle
+        with contextlib.suppress(OSError, ValueError):
+            with open(os.path.join(self.tmpdir.name, 'cache', 'bgutil-ytdlp-pot-provider', 'daemon.json')) as f:
+                os.kill(json.load(f)['pid'], signal.SIGTERM)
+        self.tmpdir.cleanup()
+
+
+def make_request(idx: int, unique: int) -> PoTokenRequest:
+    return PoTokenRequest(
+        context=PoTokenContext.GVS,
+        innertube_context={'client': {'clientName': 'WEB', 'clientVersion': '2.20250101.00.00'}},
+        internal_client_name='web',
+        visitor_data=f'benchmark-visitor-{idx % unique}',
+    )
+
+
+def run_load(provider, requests: int, concurrency: int, unique: int) -> dict:
+    latencies = []
+
+    def one(idx):
+        start = time.perf_counter()
+        provider.request_pot(make_request(idx, unique))
+        latencies.append(time.perf_counter() - start)
+
+    cpu_start, wall_start = _cpu_time(), time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as executor:
+        for future in [executor.submit(one, idx) for idx in range(requests)]:
+            future.result()
+    wall, cpu = time.perf_counter() - wall_start, _cpu_time() - cpu_start
+
+    return {
+        'tokens_per_sec': requests / wall,
+        'p50_ms': _percentile(latencies, 50) * 1000,
+        'p99_ms': _percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000,
+        'cpu_ms_per_token': cpu / requests * 1000,
+    }
+
+
+def measure_memory(provider, requests: int, unique: int) -> dict:
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for idx in range(requests):
+            provider.request_pot(make_request(idx, unique))
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+    return {
+        'retained_bytes_per_token': allocated / requests,
+        'peak_kib': peak / 1024,
+    }
+
+
+def benchmark(env: Environment, name: str, concurrency: int) -> dict:
+    args = env.args
+    ydl, provider = env.make_provider(name)
+    try:
+        if not provider.is_available():
+            raise RuntimeError(f'{provider.PROVIDER_NAME} is not available')
+        unique = args.unique or args.requests
+        # warm up, e.g. to start the script worker
+        run_load(provider, min(args.requests, concurrency), concurrency, unique)
+        result = {
+            'provider': name,
+            'concurrency': concurrency,
+            'requests': args.requests,
+            **run_load(provider, args.requests, concurrency, unique),
+        }
+        if args.memory:
+            result.update(measure_memory(provider, args.requests, unique))
+        return result
+    finally:
+        provider.close()
+        ydl.close()
+
+
+def format_table(results: list[dict]) -> str:
+    columns = [key for key in results[0] if key not in ('requests',)]
+    rows = [[f'{row[col]:.2f}' if isinstance(row[col], float) else str(row[col]) for col in columns] for row in results]
+    widths = [max(len(col), *(len(row[idx]) for row in rows)) for idx, col in enumerate(columns)]
+    return ''.join(
+        '  '.join(cell.rjust(width) for cell, width in zip(row, widths)) + '\n'
+        for row in [columns, *rows])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        '--providers', default='http,node', help=f'comma-separated list of {", ".join(PROVIDER_KEYS)} (default: %(default)s)')
+    parser.add_argument(
+        '--concurrency', default='1,8', help='comma-separated numbers of concurrent requests (default: %(default)s)')
+    parser.add_argument('--requests', type=int, default=200, help='token requests per run (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds the backend takes to mint a token')
+    parser.add_argument(
+        '--startup', type=float, default=0.05,
+        help='seconds the fake runtime takes to start, only affects the script providers (default: %(default)s)')
+    parser.add_argument('--persistent', action='store_true', help='keep the script running between requests')
+    parser.add_argument('--daemon', action='store_true', help='start the server as a daemon shared by the runs')
+    parser.add_argument('--cache', action='store_true', help='enable the plugin-side cache')
+    parser.add_argument('--unique', type=int, help='number of distinct content bindings (default: one per request)')
+    parser.add_argument('--memory', action='store_true', help='also measure allocations with tracemalloc')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to this file')
+    args = parser.parse_args()
+
+    env = Environment(args)
+    try:
+        results = [
+            benchmark(env, name, int(concurrency))
+            for name in args.providers.split(',') for concurrency in args.concurrency.split(',')]
+    finally:
+        env.close()
+
+    sys.stdout.write(format_table(results))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark what the plugin costs a yt-dlp run that never requests a PO token.
+
+Each run is a fresh Python process that loads yt-dlp, then the plugin modules, then creates and closes
+the providers like the PO token director does. With --check, exit with an error if the plugin imports
+modules yt-dlp does not, or if creating the providers resolved their configuration or JS runtime.
+
+Usage: python benchmarks/bench_startup.py [--runs 20] [--check]
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.join(BENCH_DIR, os.pardir, 'plugin')
+PLUGIN_MODULES = (
+    'yt_dlp_plugins.extractor.getpot_bgutil',
+    'yt_dlp_plugins.extractor.getpot_bgutil_http',
+    'yt_dlp_plugins.extractor.getpot_bgutil_script',
+)
+# computed on first use, creating the providers must leave them alone
+LAZY_ATTRIBUTES = (
+    '_base_urls', '_backends', '_selector', '_probe_interval', '_hedging', '_keep_warm',
+    '_server_home', '_script_path', '_script_cache_dir', '_jsrt_path', '_jsrt_fingerprint',
+    '_probe_cache', '_token_store', '_persistent', '_daemon', '_daemon_script_path', '_daemon_lockfile',
+    '_pot_cache', '_metrics', '_prefetcher', '_latencies',
+)
+PHASES = ('ytdlp_ms', 'pot_api_ms', 'plugin_import_ms', 'providers_ms')
+
+
+def child():
+    """Runs in a fresh process, prints the measurements as JSON"""
+    result = {}
+    start = time.perf_counter()
+    from yt_dlp import YoutubeDL
+    ydl = YoutubeDL({'quiet': True, 'no_warnings': True})
+    result['ytdlp_ms'] = (time.perf_counter() - start) * 1000
+
+    # the plugin needs the PO token API of yt-dlp, which imports the YouTube extractor
+    start = time.perf_counter()
+    from yt_dlp.extractor.youtube.pot._director import YoutubeIEContentProviderLogger
+    from yt_dlp.extractor.youtube.pot._registry import _pot_providers
+    result['pot_api_ms'] = (time.perf_counter() - start) * 1000
+
+    modules_before = set(sys.modules)
+    start = time.perf_counter()
+    sys.path.insert(0, PLUGIN_DIR)
+    import importlib
+    for module in PLUGIN_MODULES:
+        importlib.import_module(module)
+    result['plugin_import_ms'] = (time.perf_counter() - start) * 1000
+
+    ie = ydl.get_info_extractor('Youtube')
+    start = time.perf_counter()
+    providers = []
+    for provider_cls in _pot_providers.value.values():
+        if provider_cls.__module__ in PLUGIN_MODULES:
+            logger = YoutubeIEContentProviderLogger(
+                ie, provider_cls.PROVIDER_NAME, log_level=YoutubeIEContentProviderLogger.LogLevel.INFO)
+            providers.append(provider_cls(ie, logger, {}))
+    for provider in providers:
+        provider.close()
+    result['providers_ms'] = (time.perf_counter() - start) * 1000
+
+    result['providers'] = len(providers)
+    result['new_modules'] = sorted(
+        module for module in set(sys.modules) - modules_before if not module.startswith('yt_dlp_plugins'))
+    result['computed'] = sorted(
+        f'{provider.PROVIDER_NAME}.{attr}'
+        for provider in providers for attr in LAZY_ATTRIBUTES if attr in provider.__dict__)
+    ydl.close()
+    sys.stdout.write(json.dumps(result))
+
+
+def run_once() -> dict:
+    env = dict(os.environ)
+    # the plugin must not be picked up when yt-dlp loads its plugins, it is imported separately
+    env['YTDLP_NO_PLUGINS'] = '1'
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child'], env=env,
+        stdout=subprocess.PIPE, check=True).stdout
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20, help='number of fresh processes (default: %(default)s)')
+    parser.add_argument(
+        '--check', action='store_true',
+        help='fail if the plugin imports new modules or does work before the first token request')
+    parser.add_argument('--json', metavar='FILE', help='also write the results to this file')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    # the first run may compile the bytecode of the modules, leave it out
+    run_once()
+    runs = [run_once() for _ in range(args.runs)]
+    results = {phase: statistics.median(run[phase] for run in runs) for phase in PHASES}
+    results.update({key: runs[-1][key] for key in ('providers', 'new_modules', 'computed')})
+
+    width = max(map(len, PHASES))
+    for phase in PHASES:
+        sys.stdout.write(f'{phase.ljust(width)}  {results[phase]:8.2f}\n')
+    sys.stdout.write(f'{"new_modules".ljust(width)}  {", ".join(results["new_modules"]) or "-"}\n')
+    sys.stdout.write(f'{"computed".ljust(width)}  {", ".join(results["computed"]) or "-"}\n')
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.check and (results['new_modules'] or results['computed'] or not results['providers']):
+        sys.exit('The plugin does more work on startup than it should, see above')
+
+
+if __name__ == '__main__':
+    main()
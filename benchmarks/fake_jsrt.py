@@ -0,0 +1,94 @@
+"""
+Stand-in for `node`/`deno` running the generate_once script, answering with fake PO tokens.
+The server script (main.js or main.ts) is run as the stub server, see stub_server.py.
+
+Usage: python benchmarks/fake_jsrt.py {node,deno} [RUNTIME ARGS...] SCRIPT [SCRIPT ARGS...]
+
+The following environment variables control its behaviour:
+    BGUTIL_BENCH_VERSION    Version printed by `SCRIPT --version` (required)
+    BGUTIL_BENCH_STARTUP    Seconds to wait before running the script, to model the startup of the runtime
+    BGUTIL_BENCH_LATENCY    Seconds to wait before answering each token request
+"""
+from __future__ import annotations
+
+import contextlib
+import json
+import os
+import sys
+import time
+
+from stub_server import StubServer, UnixStubServer, fake_session_data
+
+RUNTIME_VERSIONS = {
+    'node': 'v22.0.0',
+    'deno': 'deno 2.1.0 (stable, release, x86_64-unknown-linux-gnu)',
+}
+SCRIPT_BASENAMES = ('generate_once.js', 'generate_once.ts')
+SERVER_BASENAMES = ('main.js', 'main.ts')
+
+
+def serve(args: list[str], latency: float):
+    """Run the stub server with the --socket/--port, --lockfile and --idle-timeout options of main.ts"""
+    def option(name, default=None):
+        return args[args.index(name) + 1] if name in args else default
+
+    if socket_path := option('--socket'):
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(socket_path)
+        server = UnixStubServer(socket_path, latency, os.environ['BGUTIL_BENCH_VERSION'])
+    else:
+        server = StubServer(int(option('--port', 4416)), latency, os.environ['BGUTIL_BENCH_VERSION'])
+    server.start()
+    if lockfile := option('--lockfile'):
+        with open(f'{lockfile}.tmp', 'w') as f:
+            json.dump({'pid': os.getpid(), 'url': server.base_url, 'version': server.version}, f)
+        os.replace(f'{lockfile}.tmp', lockfile)
+    idle_timeout = float(option('--idle-timeout', 0))
+    try:
+        while not idle_timeout or time.monotonic() - server.last_request < idle_timeout:
+            time.sleep(0.1)
+    finally:
+        for path in (lockfile, socket_path):
+            if path:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(path)
+
+
+def main(runtime: str, args: list[str]) -> int:
+    if args == ['--version']:
+        sys.stdout.write(f'{RUNTIME_VERSIONS[runtime]}\n')
+        return 0
+
+    script_idx = next(
+        idx for idx, arg in enumerate(args) if os.path.basename(arg) in (*SCRIPT_BASENAMES, *SERVER_BASENAMES))
+    script_args = args[script_idx + 1:]
+    time.sleep(float(os.getenv('BGUTIL_BENCH_STARTUP') or 0))
+    latency = float(os.getenv('BGUTIL_BENCH_LATENCY') or 0)
+
+    if os.path.basename(args[script_idx]) in SERVER_BASENAMES:
+        serve(script_args, latency)
+    elif '--version' in script_args:
+        sys.stdout.write(f'{os.environ["BGUTIL_BENCH_VERSION"]}\n')
+    elif '--persistent' in script_args:
+        for line in sys.stdin:
+            request = json.loads(line)
+            time.sleep(latency)
+            sys.stdout.write(json.dumps({'id': request.get('id'), **fake_session_data(request['content_binding'])}) + '\n')
+            sys.stdout.flush()
+    else:
+        time.sleep(latency)
+        content_binding = script_args[script_args.index('-c') + 1]
+        response = json.dumps(fake_session_data(content_binding)).encode()
+        if '--framed' in script_args:
+            # logs go to stderr, stdout only has the length of the response and the response
+            sys.stderr.write(f'Generating POT for {content_binding}\n')
+            sys.stdout.buffer.write(b'%d\n%s' % (len(response), response))
+        else:
+            # older scripts log to stdout before the JSON response
+            sys.stdout.write(f'Generating POT for {content_binding}\n')
+            sys.stdout.write(response.decode() + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1], sys.argv[2:]))
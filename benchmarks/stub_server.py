@@ -0,0 +1,130 @@
+"""
+Stand-in for the bgutil HTTP server, answering every request with a fake PO token after a fixed delay.
+
+Usage: python benchmarks/stub_server.py [--port PORT] [--latency SECONDS]
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import http.server
+import json
+import os
+import re
+import socketserver
+import sys
+import threading
+import time
+
+FAKE_EXPIRES_AT = '2099-01-01T00:00:00.000Z'
+
+
+def plugin_version() -> str:
+    """The version of the plugin in this tree, so that the version checks of the providers pass"""
+    path = os.path.join(os.path.dirname(__file__), os.pardir, 'plugin', 'yt_dlp_plugins', 'extractor', 'getpot_bgutil.py')
+    with open(path, encoding='utf-8') as f:
+        return re.search(r"^__version__ = '([^']+)'", f.read(), re.MULTILINE).group(1)
+
+
+def fake_session_data(content_binding: str) -> dict:
+    return {
+        'poToken': f'fake-pot-{content_binding}',
+        'contentBinding': content_binding,
+        'expiresAt': FAKE_EXPIRES_AT,
+    }
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # like node, so that headers and body written separately are not delayed
+    disable_nagle_algorithm = True
+    server: StubServer
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status: int, data: dict):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.server.last_request = time.monotonic()
+        if self.path == '/ping':
+            self._send_json(200, {'server_uptime': time.monotonic() - self.server.started, 'version': self.server.version})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+        time.sleep(self.server.latency)
+        self.server.last_request = time.monotonic()
+        if self.path == '/get_pot':
+            self._send_json(200, fake_session_data(body.get('content_binding') or 'visitor'))
+        elif self.path == '/get_pot_batch':
+            self._send_json(200, {'results': [fake_session_data(cb) for cb in body.get('content_bindings') or []]})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+
+class _UnixStubHandler(_StubHandler):
+    disable_nagle_algorithm = False
+
+    def address_string(self):
+        return 'unix'
+
+
+class StubServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port: int = 0, latency: float = 0.0, version: str | None = None):
+        super().__init__(('127.0.0.1', port), _StubHandler)
+        self.latency = latency
+        self.version = version or plugin_version()
+        self.started = self.last_request = time.monotonic()
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def start(self) -> StubServer:
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class UnixStubServer(socketserver.ThreadingUnixStreamServer, StubServer):
+    """StubServer listening on a Unix domain socket, like the server started with --socket"""
+
+    def __init__(self, socket_path: str, latency: float = 0.0, version: str | None = None):
+        socketserver.ThreadingUnixStreamServer.__init__(self, socket_path, _UnixStubHandler)
+        self.latency = latency
+        self.version = version or plugin_version()
+        self.started = self.last_request = time.monotonic()
+
+    @property
+    def base_url(self) -> str:
+        return f'unix://{self.server_address}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--port', type=int, default=4416)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before answering a POST request')
+    parser.add_argument('--version', help='version reported by /ping (default: the version of the plugin)')
+    args = parser.parse_args()
+
+    server = StubServer(args.port, args.latency, args.version)
+    sys.stderr.write(f'Stub server listening on {server.base_url}\n')
+    with contextlib.suppress(KeyboardInterrupt):
+        server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
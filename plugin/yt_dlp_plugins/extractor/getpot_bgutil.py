@@ -3,18 +3,245 @@ from __future__ import annotations
 __version__ = '1.2.2'
 
 import abc
+import collections
+import concurrent.futures
+import contextlib
+import dataclasses
+import functools
 import json
+import os
+import threading
+import time
+from typing import Callable, Iterable, TypeVar
 
 from yt_dlp.extractor.youtube.pot.provider import (
     ExternalRequestFeature,
     PoTokenContext,
     PoTokenProvider,
+    PoTokenProviderError,
     PoTokenProviderRejectedRequest,
+    PoTokenRequest,
+    PoTokenResponse,
 )
-from yt_dlp.extractor.youtube.pot.utils import WEBPO_CLIENTS
-from yt_dlp.utils import js_to_json
+from yt_dlp.extractor.youtube.pot.utils import WEBPO_CLIENTS, get_webpo_content_binding
+from yt_dlp.utils import int_or_none, js_to_json
 from yt_dlp.utils.traversal import traverse_obj
 
+T = TypeVar('T')
+
+
+class _PoTokenMemoryCache:
+    """In-memory PO token cache with per-entry expiry and LRU eviction"""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: collections.OrderedDict[tuple, tuple[str, int]] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple) -> tuple[str, int] | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def store(self, key: tuple, po_token: str, expires_at: int | None = None):
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        max_expires_at = int(time.time()) + self.ttl
+        with self._lock:
+            self._entries[key] = (po_token, min(expires_at or max_expires_at, max_expires_at))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class _locked_cached_property(functools.cached_property):
+    """A cached_property that is computed only once per instance, even when first accessed from several threads"""
+
+    def __init__(self, func):
+        super().__init__(func)
+        self._init_lock = threading.RLock()
+
+    def __get__(self, instance, owner=None):
+        # once set, the instance attribute takes precedence and this is not called anymore
+        with self._init_lock:
+            return super().__get__(instance, owner)
+
+
+class _SingleFlight:
+    """Coalesces concurrent calls with the same key, so that only the first one runs and the others share its outcome"""
+
+    def __init__(self):
+        self._calls: dict[tuple, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: tuple, func: Callable[[], T]) -> tuple[T, bool]:
+        """@returns    The result of func, and whether it was shared with another call"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is None:
+                future = self._calls[key] = concurrent.futures.Future()
+                leader = True
+            else:
+                leader = False
+        if not leader:
+            return future.result(), True
+
+        try:
+            result = func()
+        except BaseException as e:
+            self._finish(key)
+            future.set_exception(e)
+            raise
+        self._finish(key)
+        future.set_result(result)
+        return result, False
+
+    def _finish(self, key: tuple):
+        with self._lock:
+            del self._calls[key]
+
+
+class _PoTokenPrefetcher:
+    """Generates PO tokens ahead of time in a bounded pool of background threads"""
+
+    def __init__(self, fetch: Callable[[tuple, PoTokenRequest], object], max_workers: int, max_pending: int):
+        self._fetch = fetch
+        self.max_pending = max_pending
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix='bgutil-prefetch')
+        self._pending: dict[tuple, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def submit(self, key: tuple, request: PoTokenRequest) -> bool:
+        with self._lock:
+            # the executor refuses new work once shut down
+            if self._closed or key in self._pending or len(self._pending) >= self.max_pending:
+                return False
+            future = self._executor.submit(self._fetch, key, request)
+            self._pending[key] = future
+        future.add_done_callback(lambda _: self._done(key))
+        return True
+
+    def _done(self, key: tuple):
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            pending, self._pending = self._pending, {}
+        for future in pending.values():
+            future.cancel()
+        self._executor.shutdown(wait=False)
+
+
+class _PoTokenMetrics:
+    """Counters and latency histograms, exported as JSON or in the Prometheus text format"""
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0)
+
+    def __init__(self, **const_labels: str):
+        self.const_labels = const_labels
+        self._counters: collections.Counter[tuple] = collections.Counter()
+        # name, labels -> per-bucket counts, then total count and sum
+        self._histograms: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def inc(self, name: str, value: int = 1, **labels):
+        with self._lock:
+            self._counters[self._key(name, labels)] += value
+
+    def observe(self, name: str, seconds: float, **labels):
+        with self._lock:
+            hist = self._histograms.setdefault(self._key(name, labels), [0] * len(self.BUCKETS) + [0, 0.0])
+            for idx, bound in enumerate(self.BUCKETS):
+                if seconds <= bound:
+                    hist[idx] += 1
+            hist[-2] += 1
+            hist[-1] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, name: str, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                'labels': dict(self.const_labels),
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in sorted(self._counters.items())],
+                'histograms': [{
+                    'name': name,
+                    'labels': dict(labels),
+                    'buckets': dict(zip(map(str, self.BUCKETS), hist[:-2])),
+                    'count': hist[-2],
+                    'sum': hist[-1],
+                } for (name, labels), hist in sorted(self._histograms.items())],
+            }
+
+    def to_prometheus(self, prefix: str = 'bgutil_pot_') -> str:
+        def fmt_labels(labels, **extra):
+            labels = {**self.const_labels, **labels, **extra}
+            escaped = (
+                str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for v in labels.values())
+            return '{' + ','.join(f'{k}="{v}"' for k, v in zip(labels, escaped)) + '}'
+
+        snapshot = self.snapshot()
+        lines = []
+        for counter in snapshot['counters']:
+            name = f'{prefix}{counter["name"]}_total'
+            lines.append(f'{name}{fmt_labels(counter["labels"])} {counter["value"]}')
+        for hist in snapshot['histograms']:
+            name = f'{prefix}{hist["name"]}_seconds'
+            for bound, value in hist['buckets'].items():
+                lines.append(f'{name}_bucket{fmt_labels(hist["labels"], le=bound)} {value}')
+            lines.append(f'{name}_bucket{fmt_labels(hist["labels"], le="+Inf")} {hist["count"]}')
+            lines.append(f'{name}_count{fmt_labels(hist["labels"])} {hist["count"]}')
+            lines.append(f'{name}_sum{fmt_labels(hist["labels"])} {hist["sum"]}')
+        return ''.join(f'{line}\n' for line in lines)
+
+
+class _LatencyTracker:
+    """Latencies of the last successful calls, by operation"""
+
+    def __init__(self, window: int, min_samples: int):
+        self._window = window
+        self._min_samples = min_samples
+        self._samples: dict[str, collections.deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(key, collections.deque(maxlen=self._window)).append(seconds)
+
+    def percentile(self, key: str, pct: float) -> float | None:
+        """@returns None until enough calls have been recorded"""
+        with self._lock:
+            samples = sorted(self._samples.get(key) or ())
+        if len(samples) < self._min_samples:
+            return None
+        return samples[min(len(samples) - 1, int(pct / 100 * len(samples)))]
+
 
 class BgUtilPTPBase(PoTokenProvider, abc.ABC):
     PROVIDER_VERSION = __version__
@@ -36,6 +263,263 @@ class BgUtilPTPBase(PoTokenProvider, abc.ABC):
         PoTokenContext.SUBS,
     )
     _GETPOT_TIMEOUT = 20.0
+    # Keep in sync with the default TOKEN_TTL of the server
+    _CACHE_DEFAULT_TTL = 6 * 60 * 60
+    _CACHE_DEFAULT_SIZE = 1024
+    _PREFETCH_DEFAULT_MAX_PENDING = 16
+    _ATTESTATION_CACHE_SIZE = 8
+    _LATENCY_WINDOW = 256
+    _LATENCY_MIN_SAMPLES = 20
+    # Adaptive timeouts are this many times the p99 latency, but never below the minimum
+    _ADAPTIVE_TIMEOUT_FACTOR = 3.0
+    _ADAPTIVE_TIMEOUT_MIN = 5.0
+
+    def _base_config_arg(self, key: str, default: T = None, *, casesense: bool = False) -> str | T:
+        return self._configuration_arg(key, default=[default], casesense=casesense)[0]
+
+    def _bool_config_arg(self, key: str, default: bool = False) -> bool:
+        value = self._base_config_arg(key)
+        if value is None:
+            return default
+        return value not in ('', '0', 'false', 'no', 'off')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._in_flight = _SingleFlight()
+        self._attestation_cache: collections.OrderedDict[tuple[int, int], dict | None] = collections.OrderedDict()
+        self._attestation_lock = threading.Lock()
+
+    @_locked_cached_property
+    def _pot_cache(self) -> _PoTokenMemoryCache:
+        return _PoTokenMemoryCache(
+            max_size=int_or_none(self._base_config_arg('cache_size'), default=self._CACHE_DEFAULT_SIZE),
+            ttl=int_or_none(self._base_config_arg('cache_ttl'), default=self._CACHE_DEFAULT_TTL))
+
+    @staticmethod
+    def _pot_cache_key(request: PoTokenRequest) -> tuple:
+        return (
+            get_webpo_content_binding(request)[0],
+            traverse_obj(request.innertube_context, ('client', 'clientName')),
+            request.context.value,
+            traverse_obj(request.innertube_context, ('client', 'remoteHost')),
+            request.request_proxy,
+            request.request_source_address,
+        )
+
+    @_locked_cached_property
+    def _metrics(self) -> _PoTokenMetrics:
+        return _PoTokenMetrics(provider=self.PROVIDER_NAME)
+
+    def metrics(self) -> dict:
+        """
+        Counters and latency histograms (in seconds) collected by this provider.
+        Pass the metrics_file extractor argument to write them to a file when yt-dlp exits.
+        """
+        return self._metrics.snapshot()
+
+    def _write_metrics_file(self):
+        if not (metrics_file := self._base_config_arg('metrics_file', casesense=True)):
+            return
+        metrics_file = os.path.expanduser(metrics_file)
+        try:
+            with open(metrics_file, 'w', encoding='utf-8') as f:
+                if metrics_file.endswith('.prom'):
+                    f.write(self._metrics.to_prometheus())
+                else:
+                    json.dump(self._metrics.snapshot(), f, indent=2)
+        except OSError as e:
+            self.logger.warning(f'Failed to write metrics to {metrics_file} (caused by {e!r})')
+
+    @_locked_cached_property
+    def _latencies(self) -> _LatencyTracker:
+        return _LatencyTracker(window=self._LATENCY_WINDOW, min_samples=self._LATENCY_MIN_SAMPLES)
+
+    @contextlib.contextmanager
+    def _track_latency(self, key: str):
+        start = time.perf_counter()
+        yield
+        # failures and timeouts are left out, they would only drag the timeouts up
+        self._latencies.record(key, time.perf_counter() - start)
+
+    def _adaptive_timeout(self, key: str, timeout: float, minimum: float = _ADAPTIVE_TIMEOUT_MIN) -> float:
+        """Shorten the timeout of an operation to a few times its p99 latency, once it is known and if enabled"""
+        if not self._bool_config_arg('adaptive_timeout'):
+            return timeout
+        p99 = self._latencies.percentile(key, 99)
+        if p99 is None:
+            return timeout
+        return min(timeout, max(minimum, p99 * self._ADAPTIVE_TIMEOUT_FACTOR))
+
+    def _real_request_pot(self, request: PoTokenRequest) -> PoTokenResponse:
+        labels = {
+            'context': request.context.value,
+            'client': request.internal_client_name,
+        }
+        try:
+            with self._metrics.timer('request', **labels):
+                return self._request_pot_cached(request, labels)
+        except PoTokenProviderRejectedRequest:
+            self._metrics.inc('rejections', **labels)
+            raise
+        except PoTokenProviderError:
+            self._metrics.inc('errors', **labels)
+            raise
+
+    def _request_pot_cached(self, request: PoTokenRequest, labels: dict) -> PoTokenResponse:
+        cache_key = self._pot_cache_key(request)
+        if self._prefetcher:
+            # don't hold on to the webpage, it is only needed for the attestation
+            self._prefetch_template = dataclasses.replace(request, video_webpage=None)
+        if not request.bypass_cache:
+            if cached := self._pot_cache.get(cache_key):
+                po_token, expires_at = cached
+                self.logger.trace(
+                    f'Using cached {request.context.value} POT for {request.internal_client_name} client')
+                self._metrics.inc('cache_hits', **labels)
+                return PoTokenResponse(po_token=po_token, expires_at=expires_at)
+
+        self._metrics.inc('cache_misses', **labels)
+        response, shared = self._generate_pot_once(cache_key, request)
+        if shared:
+            self.logger.trace('Using the POT generated for a concurrent request')
+            self._metrics.inc('coalesced', **labels)
+        return response
+
+    def _generate_pot_once(self, cache_key: tuple, request: PoTokenRequest) -> tuple[PoTokenResponse, bool]:
+        """Generate a PO token and cache it, sharing the result with identical requests made in the meantime"""
+        def generate():
+            response = self._generate_pot(request)
+            self._pot_cache.store(cache_key, response.po_token, response.expires_at)
+            return response
+
+        # don't let requests bypassing the cache join requests that could have been served from the server cache
+        return self._in_flight.do((*cache_key, request.bypass_cache), generate)
+
+    @_locked_cached_property
+    def _prefetcher(self) -> _PoTokenPrefetcher | None:
+        max_workers = int_or_none(self._base_config_arg('prefetch_workers'), default=0)
+        if max_workers <= 0:
+            return None
+        return _PoTokenPrefetcher(
+            self._prefetch_one, max_workers=max_workers,
+            max_pending=int_or_none(
+                self._base_config_arg('prefetch_max_pending'), default=self._PREFETCH_DEFAULT_MAX_PENDING))
+
+    def _prefetch_one(self, cache_key: tuple, request: PoTokenRequest):
+        try:
+            # the token may have been requested since this was scheduled
+            if self._pot_cache.get(cache_key) or not self.is_available():
+                return
+            self._generate_pot_once(cache_key, request)
+        except Exception as e:
+            self._metrics.inc('prefetch_errors', context=request.context.value, client=request.internal_client_name)
+            self.logger.debug(f'Failed to prefetch a {request.context.value} POT (caused by {e!r})')
+
+    def prefetch_pot(self, requests: Iterable[PoTokenRequest]) -> int:
+        """
+        Generate PO tokens for the given requests in the background and store them in the plugin-side cache,
+        so that later requests for them return immediately. Requires the prefetch_workers extractor argument.
+        yt-dlp never calls this: it is meant for programs embedding yt-dlp that know the upcoming videos.
+
+        @returns    The number of requests that were scheduled. Requests are dropped once
+                    prefetch_max_pending requests are in flight, if the token is already cached,
+                    or if the provider was closed
+        """
+        if not self._prefetcher:
+            return 0
+        scheduled = 0
+        for request in requests:
+            cache_key = self._pot_cache_key(request)
+            if cache_key[0] and not self._pot_cache.get(cache_key):
+                scheduled += self._prefetcher.submit(cache_key, request)
+        return scheduled
+
+    def prefetch_video_ids(
+        self, video_ids: Iterable[str], template: PoTokenRequest | None = None,
+        contexts: Iterable[PoTokenContext] = (PoTokenContext.PLAYER,),
+    ) -> int:
+        """
+        Like prefetch_pot, for upcoming videos. The requests are derived from the template,
+        or from the last request made to this provider if no template is passed.
+        """
+        template = template or getattr(self, '_prefetch_template', None)
+        if not template:
+            return 0
+        return self.prefetch_pot(
+            dataclasses.replace(template.copy(), context=context, video_id=video_id, video_webpage=None)
+            for video_id in video_ids for context in contexts)
+
+    def warm_up(self, request: PoTokenRequest | None = None) -> bool:
+        """
+        Create the BotGuard minter ahead of traffic, so that the first PO token does not wait for the challenge.
+        The minter is created for the networking (proxy, source address, IP) of the request, of the last request
+        if prefetching is enabled, or of the yt-dlp options otherwise.
+
+        @returns    Whether a minter is ready
+        """
+        request = request or getattr(self, '_prefetch_template', None)
+        if not self.is_available():
+            return False
+        try:
+            with self._metrics.timer('warm_up'):
+                return self._warm_up(request)
+        except PoTokenProviderError as e:
+            self.logger.warning(f'Failed to warm up {self.PROVIDER_NAME} (caused by {e})')
+            return False
+
+    def warm_up_proxies(self, proxies: Iterable[str | None]) -> int:
+        """
+        Create the BotGuard minters for each of these proxies ahead of a job that rotates through them,
+        so that the first PO token through every proxy does not wait for the challenge.
+        None or an empty string stands for a direct connection. The source address and TLS verification
+        are taken from the yt-dlp options.
+
+        @returns    The number of proxies with a minter ready
+        """
+        proxies = list(dict.fromkeys(proxy or '' for proxy in proxies))
+        if not proxies or not self.is_available():
+            return 0
+        try:
+            with self._metrics.timer('warm_up'):
+                return self._warm_up_proxies(proxies)
+        except PoTokenProviderError as e:
+            self.logger.warning(f'Failed to warm up {self.PROVIDER_NAME} for {len(proxies)} proxies (caused by {e})')
+            return 0
+
+    def _networking_data(self, request: PoTokenRequest | None) -> dict:
+        if request:
+            return {
+                'disable_tls_verification': not request.request_verify_tls,
+                'innertube_context': request.innertube_context,
+                'proxy': request.request_proxy,
+                'source_address': request.request_source_address,
+            }
+        return {
+            'disable_tls_verification': bool(self.ie.get_param('nocheckcertificate')),
+            'proxy': self.ie.get_param('proxy'),
+            'source_address': self.ie.get_param('source_address'),
+        }
+
+    def close(self):
+        if self.__dict__.get('_prefetcher'):
+            self._prefetcher.close()
+        self._write_metrics_file()
+        super().close()
+
+    @abc.abstractmethod
+    def _generate_pot(self, request: PoTokenRequest) -> PoTokenResponse:
+        """Generate a PO token, bypassing the plugin-side cache"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _warm_up(self, request: PoTokenRequest | None) -> bool:
+        """Create the minter for the networking of the request, see warm_up"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def _warm_up_proxies(self, proxies: list[str]) -> int:
+        """Create the minter of each proxy, see warm_up_proxies"""
+        raise NotImplementedError
 
     def _info_and_raise(self, msg, raise_from=None):
         self.logger.info(msg)
@@ -66,23 +550,65 @@ class BgUtilPTPBase(PoTokenProvider, abc.ABC):
     def _get_attestation(self, webpage: str | None):
         if not webpage:
             return None
-        raw_challenge_data = self.ie._search_regex(
-            r'''(?sx)window\.ytAtR\s*=\s*(?P<raw_cd>(?P<q>['"])
-                (?:
-                    \\.|
-                    (?!(?P=q)).
-                )*
-            (?P=q))\s*;''',
-            webpage,
-            'raw challenge data',
-            default=None,
-            group='raw_cd',
-        )
-        att_txt = traverse_obj(raw_challenge_data, ({js_to_json}, {json.loads}, {json.loads}, 'bgChallenge'))
+        # the same webpage is passed for every context of a video, only parse it once
+        page_key = (len(webpage), hash(webpage))
+        with self._attestation_lock:
+            if page_key in self._attestation_cache:
+                self._attestation_cache.move_to_end(page_key)
+                return self._attestation_cache[page_key]
+        with self._metrics.timer('attestation'):
+            att_txt = self._extract_attestation(webpage)
+        with self._attestation_lock:
+            self._attestation_cache[page_key] = att_txt
+            while len(self._attestation_cache) > self._ATTESTATION_CACHE_SIZE:
+                self._attestation_cache.popitem(last=False)
+        return att_txt
+
+    def _extract_attestation(self, webpage: str):
+        att_txt = traverse_obj(self._find_raw_challenge_data(webpage), ({self._parse_raw_challenge_data}, 'bgChallenge'))
         if not att_txt:
             self.logger.warning('Failed to extract initial attestation from the webpage')
             return None
         return att_txt
 
+    @staticmethod
+    def _find_raw_challenge_data(webpage: str) -> str | None:
+        """Find the JS string literal assigned to window.ytAtR"""
+        start = 0
+        while (start := webpage.find('window.ytAtR', start)) != -1:
+            start += len('window.ytAtR')
+            pos = start
+            while pos < len(webpage) and webpage[pos].isspace():
+                pos += 1
+            if webpage[pos:pos + 1] != '=':
+                continue
+            pos += 1
+            while pos < len(webpage) and webpage[pos].isspace():
+                pos += 1
+            quote = webpage[pos:pos + 1]
+            if quote not in ('"', "'"):
+                continue
+            end = pos
+            while (end := webpage.find(quote, end + 1)) != -1:
+                # the quote is escaped if preceded by an odd number of backslashes
+                backslashes = end - 1
+                while webpage[backslashes] == '\\':
+                    backslashes -= 1
+                if (end - backslashes) % 2:
+                    return webpage[pos:end + 1]
+            return None
+        return None
+
+    @staticmethod
+    def _parse_raw_challenge_data(raw_challenge_data: str) -> dict:
+        # The literal is a JS string containing JSON. Double quoted literals without JS-only escapes
+        # are valid JSON strings already, so js_to_json is only needed as a fallback
+        try:
+            if raw_challenge_data[0] == '"':
+                return json.loads(json.loads(raw_challenge_data))
+        except ValueError:
+            pass
+        return json.loads(json.loads(js_to_json(raw_challenge_data)))
+
 
 __all__ = ['__version__']
@@ -1,10 +1,23 @@
 from __future__ import annotations
 
+import bisect
+import collections
+import concurrent.futures
+import contextlib
 import functools
+import hashlib
+import http.client
+import io
+import itertools
 import json
+import socket
+import threading
 import time
+import urllib.parse
+from typing import Iterable
 
 from yt_dlp.extractor.youtube.pot.provider import (
+    ExternalRequestFeature,
     PoTokenProviderError,
     PoTokenProviderRejectedRequest,
     PoTokenRequest,
@@ -13,10 +26,250 @@ from yt_dlp.extractor.youtube.pot.provider import (
     register_provider,
 )
 from yt_dlp.extractor.youtube.pot.utils import get_webpo_content_binding
-from yt_dlp.networking.common import Request
+from yt_dlp.networking.common import Response
 from yt_dlp.networking.exceptions import HTTPError, TransportError
+from yt_dlp.utils import float_or_none, format_bytes, int_or_none, parse_iso8601
+from yt_dlp.utils.traversal import traverse_obj
 
-from yt_dlp_plugins.extractor.getpot_bgutil import BgUtilPTPBase
+from yt_dlp_plugins.extractor.getpot_bgutil import BgUtilPTPBase, _locked_cached_property
+
+
+class _ReadTimeoutError(TransportError):
+    """The server accepted the request, but did not answer in time"""
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix domain socket"""
+
+    def __init__(self, socket_path: str, *args, **kwargs):
+        super().__init__('localhost', *args, **kwargs)
+        self.socket_path = socket_path
+
+    def connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+        except OSError:
+            sock.close()
+            raise
+        self.sock = sock
+
+
+class _BgUtilHTTPConnectionPool:
+    """A pool of keep-alive HTTP/1.1 connections to one bgutil HTTP server"""
+
+    def __init__(self, base_url: str, max_size: int, idle_timeout: float):
+        parsed_url = urllib.parse.urlparse(base_url)
+        if parsed_url.scheme == 'unix':
+            # unix:///path/to.sock, the whole path refers to the socket
+            self._connection_cls = functools.partial(_UnixHTTPConnection, parsed_url.path)
+            self._path_prefix = ''
+        else:
+            self._connection_cls = functools.partial(
+                http.client.HTTPSConnection if parsed_url.scheme == 'https'
+                else http.client.HTTPConnection,
+                parsed_url.hostname, parsed_url.port)
+            self._path_prefix = parsed_url.path.rstrip('/')
+        self.base_url = base_url
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._idle: list[tuple[http.client.HTTPConnection, float]] = []
+        self._lock = threading.Lock()
+
+    def _get_connection(self) -> tuple[http.client.HTTPConnection, bool]:
+        now = time.monotonic()
+        with self._lock:
+            while self._idle:
+                conn, last_used = self._idle.pop()
+                if now - last_used < self.idle_timeout:
+                    return conn, True
+                conn.close()
+        return self._connection_cls(), False
+
+    def _put_connection(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            if len(self._idle) < self.max_size:
+                self._idle.append((conn, time.monotonic()))
+                return
+        conn.close()
+
+    def request(self, method: str, path: str, data: bytes | None = None,
+                headers: dict[str, str] | None = None, timeout: float | None = None) -> Response:
+        while True:
+            conn, reused = self._get_connection()
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            sent = False
+            try:
+                conn.request(method, self._path_prefix + path, body=data, headers=headers or {})
+                sent = True
+                response = conn.getresponse()
+                body = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                conn.close()
+                if reused:
+                    # the server has closed the idle connection, retry with another one
+                    continue
+                raise TransportError(cause=e) from e
+            except (OSError, http.client.HTTPException) as e:
+                conn.close()
+                if sent and isinstance(e, socket.timeout):
+                    raise _ReadTimeoutError(cause=e) from e
+                raise TransportError(cause=e) from e
+            break
+
+        if response.will_close:
+            conn.close()
+        else:
+            self._put_connection(conn)
+
+        response = Response(
+            io.BytesIO(body), f'{self.base_url}{path}', dict(response.getheaders()),
+            status=response.status, reason=response.reason)
+        if not 200 <= response.status < 300:
+            raise HTTPError(response)
+        return response
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            conn.close()
+
+
+class _CircuitBreaker:
+    """
+    Closed/open/half-open state machine tracking whether a server can take requests
+
+    The breaker opens after failure_threshold consecutive failures. Once the backoff has passed,
+    it turns half-open and lets one trial through, which either closes it or opens it again
+    with the backoff doubled, up to max_backoff.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold: int, backoff: float, max_backoff: float):
+        self.failure_threshold = max(failure_threshold, 1)
+        self.base_backoff = backoff
+        self.max_backoff = max_backoff
+        self._state = self.CLOSED
+        self._failures = 0
+        self._backoff = backoff
+        self._retry_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def _update_state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() >= self._retry_at:
+            self._state = self.HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._update_state()
+
+    @property
+    def retry_in(self) -> float:
+        with self._lock:
+            return max(self._retry_at - time.monotonic(), 0)
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            state = self._update_state()
+            if state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return state == self.CLOSED
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._backoff = self.base_backoff
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._update_state() == self.HALF_OPEN:
+                self._backoff = min(self._backoff * 2, self.max_backoff)
+            elif self._state == self.OPEN or self._failures < self.failure_threshold:
+                return
+            self._state = self.OPEN
+            self._retry_at = time.monotonic() + self._backoff
+            self._trial_in_flight = False
+
+
+class _BgUtilBackend:
+    """One bgutil HTTP server, with its connection pool and health"""
+
+    def __init__(self, pool: _BgUtilHTTPConnectionPool, breaker: _CircuitBreaker):
+        self.pool = pool
+        self.breaker = breaker
+        self.outstanding = 0
+        # whether /ping answered with a compatible version, checked before the first request
+        self.version_checked = False
+        self.version_lock = threading.Lock()
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return self.pool.base_url
+
+    @contextlib.contextmanager
+    def track(self):
+        """Count the request as outstanding while in the block"""
+        with self._lock:
+            self.outstanding += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.outstanding -= 1
+
+
+class _BackendSelector:
+    """Orders the backends by preference for a request, the first available one is used"""
+    ROUND_ROBIN = 'round_robin'
+    LEAST_OUTSTANDING = 'least_outstanding'
+    CONSISTENT_HASH = 'consistent_hash'
+    STRATEGIES = (ROUND_ROBIN, LEAST_OUTSTANDING, CONSISTENT_HASH)
+    _VIRTUAL_NODES = 64
+
+    def __init__(self, backends: list[_BgUtilBackend], strategy: str):
+        self.backends = backends
+        self.strategy = strategy
+        self._counter = itertools.count()
+        # each backend is placed on the ring many times so that the keys are evenly spread
+        self._ring = sorted(
+            (self._hash(f'{backend.base_url}#{idx}'), backend_idx)
+            for backend_idx, backend in enumerate(backends) for idx in range(self._VIRTUAL_NODES))
+        self._ring_hashes = [ring_hash for ring_hash, _ in self._ring]
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], 'big')
+
+    def candidates(self, key: str | None = None) -> list[_BgUtilBackend]:
+        if len(self.backends) == 1:
+            return self.backends
+        if self.strategy == self.CONSISTENT_HASH and key:
+            # walk the ring clockwise from the key, the next backends take over if the owner is down
+            start = bisect.bisect(self._ring_hashes, self._hash(key))
+            order = dict.fromkeys(
+                self._ring[(start + idx) % len(self._ring)][1] for idx in range(len(self._ring)))
+            return [self.backends[idx] for idx in order]
+        # rotate so that ties are broken in turn
+        offset = next(self._counter) % len(self.backends)
+        rotated = self.backends[offset:] + self.backends[:offset]
+        if self.strategy == self.LEAST_OUTSTANDING:
+            rotated.sort(key=lambda backend: backend.outstanding)
+        return rotated
 
 
 @register_provider
@@ -24,18 +277,31 @@ class BgUtilHTTPPTP(BgUtilPTPBase):
     PROVIDER_NAME = 'bgutil:http'
     DEFAULT_BASE_URL = 'http://127.0.0.1:4416'
     _GET_SERVER_VSN_TIMEOUT = 5.0
+    _PING_TIMEOUT_MIN = 1.0
+    _ERROR_RESPONSE_MAX_SIZE = 512
+    _POOL_DEFAULT_SIZE = 4
+    _POOL_DEFAULT_IDLE_TIMEOUT = 30.0
+    _PROBE_DEFAULT_INTERVAL = 60.0
+    _PROBE_DEFAULT_BACKOFF = 1.0
+    _PROBE_DEFAULT_MAX_BACKOFF = 60.0
+    _PROBE_DEFAULT_FAILURE_THRESHOLD = 1
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self._last_server_check = 0
-        self._server_available = True
+        self._health_check_thread: threading.Thread | None = None
+        self._health_check_stop = threading.Event()
+        self._health_check_lock = threading.Lock()
+        # the tokens requested through each egress and the proxies warmed up, for _is_hot
+        self._egress_uses: collections.Counter[str] = collections.Counter()
+        self._listed_proxies: set[str] = set()
+        self._egress_lock = threading.Lock()
 
     @functools.cached_property
-    def _base_url(self):
-        base_url = self._configuration_arg('base_url', default=[None])[0]
+    def _base_urls(self) -> list[str]:
+        base_urls = self._configuration_arg('base_url', casesense=True)
 
-        if base_url:
-            return base_url
+        if base_urls:
+            return base_urls
 
         # check deprecated arg
         deprecated_base_url = self.ie._configuration_arg(
@@ -47,68 +313,206 @@ class BgUtilHTTPPTP(BgUtilPTPBase):
         # default if no arg was passed
         self.logger.debug(
             f'No base_url provided, defaulting to {self.DEFAULT_BASE_URL}')
-        return self.DEFAULT_BASE_URL
+        return [self.DEFAULT_BASE_URL]
+
+    @_locked_cached_property
+    def _backends(self) -> list[_BgUtilBackend]:
+        pool_size = int_or_none(self._base_config_arg('pool_size'), default=self._POOL_DEFAULT_SIZE)
+        pool_idle_timeout = float_or_none(
+            self._base_config_arg('pool_idle_timeout'), default=self._POOL_DEFAULT_IDLE_TIMEOUT)
+        failure_threshold = int_or_none(
+            self._base_config_arg('failure_threshold'), default=self._PROBE_DEFAULT_FAILURE_THRESHOLD)
+        backoff = float_or_none(self._base_config_arg('probe_backoff'), default=self._PROBE_DEFAULT_BACKOFF)
+        max_backoff = float_or_none(
+            self._base_config_arg('probe_max_backoff'), default=self._PROBE_DEFAULT_MAX_BACKOFF)
+        return [
+            _BgUtilBackend(
+                _BgUtilHTTPConnectionPool(base_url, max_size=pool_size, idle_timeout=pool_idle_timeout),
+                _CircuitBreaker(failure_threshold=failure_threshold, backoff=backoff, max_backoff=max_backoff))
+            for base_url in dict.fromkeys(self._base_urls)]
+
+    @_locked_cached_property
+    def _selector(self) -> _BackendSelector:
+        strategy = self._base_config_arg('balance', default=_BackendSelector.CONSISTENT_HASH)
+        if strategy not in _BackendSelector.STRATEGIES:
+            self.logger.warning(
+                f'Unknown balance strategy {strategy!r}, using {_BackendSelector.CONSISTENT_HASH}. '
+                f'Valid strategies are: {", ".join(_BackendSelector.STRATEGIES)}', once=True)
+            strategy = _BackendSelector.CONSISTENT_HASH
+        return _BackendSelector(self._backends, strategy)
+
+    @functools.cached_property
+    def _keep_warm(self) -> bool:
+        """Ask the servers to create the minters reused by this client again before they expire"""
+        return self._bool_config_arg('keep_warm')
+
+    def _is_hot(self, data: dict, use: bool = True) -> bool:
+        """
+        Whether the servers should keep the minter of this egress warm: with keep_warm, if the egress
+        is used for more than one token in this run or listed to be warmed up
+
+        @param use  Count a token requested through the egress
+        """
+        if not self._keep_warm:
+            return False
+        egress_key = self._egress_key(data)
+        with self._egress_lock:
+            if use:
+                self._egress_uses[egress_key] += 1
+            return (self._egress_uses[egress_key] > 1 or data.get('proxy') in self._listed_proxies
+                    or data.get('proxy') in self._configuration_arg('warm_up_proxies', casesense=True))
+
+    @functools.cached_property
+    def _probe_interval(self) -> float:
+        return float_or_none(self._base_config_arg('probe_interval'), default=self._PROBE_DEFAULT_INTERVAL)
+
+    def close(self):
+        self._health_check_stop.set()
+        if self.__dict__.get('_hedge_executor'):
+            self._hedge_executor.shutdown(wait=False)
+        # only if asked to and the servers were used during the run, each request times out after a second
+        if (self.__dict__.get('_backends') and self._bool_config_arg('cache_stats')
+                and self.logger.log_level <= self.logger.LogLevel.DEBUG):
+            for base_url, stats in self.server_cache_stats().items():
+                self.logger.debug(f'Cache stats of {base_url}: {self._format_cache_stats(stats)}')
+        for backend in self.__dict__.get('_backends') or []:
+            backend.pool.close()
+        super().close()
+
+    def server_cache_stats(self) -> dict[str, dict]:
+        """
+        The stats of the POT and minter caches of the servers: entries, estimated bytes, evictions, hit ratio...
+
+        @returns    The JSON of GET /cache_stats by base URL. Servers that are down or too old are left out
+        """
+        all_stats = {}
+        for backend in self._backends:
+            if backend.breaker.state != _CircuitBreaker.CLOSED:
+                continue
+            try:
+                all_stats[backend.base_url] = json.load(
+                    backend.pool.request('GET', '/cache_stats', timeout=self._PING_TIMEOUT_MIN))
+            except Exception as e:
+                # older servers respond with 404
+                self.logger.trace(f'Failed to get the cache stats of {backend.base_url} (caused by {e!r})')
+        return all_stats
+
+    @staticmethod
+    def _format_cache_stats(stats: dict) -> str:
+        def format_cache(cache_stats):
+            if not isinstance(cache_stats, dict):
+                return 'none'
+            hit_ratio = cache_stats.get('hit_ratio')
+            return (
+                f'{cache_stats.get("entries")} entries, {format_bytes(cache_stats.get("bytes"))}, '
+                f'{cache_stats.get("evictions")} evictions, '
+                f'{"-" if hit_ratio is None else f"{hit_ratio:.1%}"} hits')
+
+        return '; '.join(f'{name}: {format_cache(stats.get(name))}' for name in ('tokens', 'minters'))
+
+    def _start_health_check(self):
+        with self._health_check_lock:
+            if self._health_check_thread or self._health_check_stop.is_set():
+                return
+            self._health_check_thread = threading.Thread(
+                target=self._health_check_loop, name='bgutil-health-check', daemon=True)
+            self._health_check_thread.start()
+
+    def _health_check_loop(self):
+        # the servers that were just checked before a request can wait for the next interval
+        next_probe = {
+            backend: time.monotonic() + self._probe_interval if backend.version_checked else 0.0
+            for backend in self._backends}
+        # with warm_up or warm_up_proxies, create the minters of each server as soon as it is reachable
+        warm_up = self._bool_config_arg('warm_up')
+        warm_up_proxies = self._configuration_arg('warm_up_proxies', casesense=True)
+        to_warm_up = set(self._backends) if warm_up or warm_up_proxies else set()
+        while not self._health_check_stop.wait(max(min(next_probe.values()) - time.monotonic(), 0)):
+            for backend in self._backends:
+                if self._health_check_stop.is_set():
+                    return
+                if time.monotonic() < next_probe[backend]:
+                    continue
+                if backend.breaker.state != _CircuitBreaker.OPEN:
+                    if self._probe_server(backend) and backend in to_warm_up:
+                        to_warm_up.discard(backend)
+                        if warm_up:
+                            self._warm_up_backend(backend, self._warm_up_data(None))
+                        if warm_up_proxies:
+                            self._warm_up_backend_proxies(backend, warm_up_proxies)
+                next_probe[backend] = time.monotonic() + (
+                    self._probe_interval if backend.breaker.state == _CircuitBreaker.CLOSED
+                    else backend.breaker.retry_in)
+
+    def _check_version_once(self, backend: _BgUtilBackend) -> bool:
+        """Probe a server before its first request, so that none is used with a mismatched version"""
+        if backend.version_checked:
+            return True
+        with backend.version_lock:
+            return backend.version_checked or self._probe_server(backend)
+
+    def _probe_server(self, backend: _BgUtilBackend) -> bool:
+        try:
+            available = self._check_server_availability(backend)
+        except PoTokenProviderRejectedRequest:
+            available = False
+        if available:
+            backend.breaker.record_success()
+        else:
+            backend.breaker.record_failure()
+        return available
 
-    def _check_server_availability(self, ctx: PoTokenRequest):
-        if self._last_server_check + 60 > time.time():
-            return self._server_available
+    def _raise_server_unreachable(self, base_url: str, endpoint: str, e: Exception):
+        script_path_provided = self.ie._configuration_arg(
+            ie_key='youtubepot-bgutilscript', key='script_path', default=[None])[0] is not None
 
-        self._server_available = False
+        warning_base = f'Error reaching {endpoint} (caused by {e.__class__.__name__}). '
+        if script_path_provided:  # server down is expected, log info
+            self._info_and_raise(
+                warning_base + 'This is expected if you are using the script method.')
+        else:
+            self._warn_and_raise(
+                warning_base + f'Please make sure that the server is reachable at {base_url}.')
+
+    def _check_server_availability(self, backend: _BgUtilBackend):
+        base_url = backend.base_url
         try:
             self.logger.trace(
-                f'Checking server availability at {self._base_url}/ping')
-            response = json.load(self._request_webpage(Request(
-                f'{self._base_url}/ping', extensions={'timeout': self._GET_SERVER_VSN_TIMEOUT}, proxies={'all': None}),
-                note=False))
+                f'Checking server availability at {base_url}/ping')
+            with self._track_latency('/ping'):
+                response = json.load(backend.pool.request('GET', '/ping', timeout=self._adaptive_timeout(
+                    '/ping', self._GET_SERVER_VSN_TIMEOUT, minimum=self._PING_TIMEOUT_MIN)))
         except TransportError as e:
             # the server may be down
-            script_path_provided = self.ie._configuration_arg(
-                ie_key='youtubepot-bgutilscript', key='script_path', default=[None])[0] is not None
-
-            warning_base = f'Error reaching GET {self._base_url}/ping (caused by {e.__class__.__name__}). '
-            if script_path_provided:  # server down is expected, log info
-                self._info_and_raise(
-                    warning_base + 'This is expected if you are using the script method.')
-            else:
-                self._warn_and_raise(
-                    warning_base + f'Please make sure that the server is reachable at {self._base_url}.')
-
+            self._raise_server_unreachable(base_url, f'GET {base_url}/ping', e)
             return
         except HTTPError as e:
             # may be an old server, don't raise
             self.logger.warning(
-                f'HTTP Error reaching GET /ping (caused by {e!r})', once=True)
+                f'HTTP Error reaching GET {base_url}/ping (caused by {e!r})', once=True)
             return
         except json.JSONDecodeError as e:
             # invalid server
             self._warn_and_raise(
-                f'Error parsing ping response JSON (caused by {e!r})')
+                f'Error parsing ping response JSON from {base_url} (caused by {e!r})')
             return
         except Exception as e:
             self._warn_and_raise(
-                f'Unknown error reaching GET /ping (caused by {e!r})', raise_from=e)
+                f'Unknown error reaching GET {base_url}/ping (caused by {e!r})', raise_from=e)
             return
         else:
             self._check_version(response.get('version', ''), name='HTTP server')
-            self._server_available = True
+            backend.version_checked = True
             return True
-        finally:
-            self._last_server_check = time.time()
 
     def is_available(self):
-        return self._server_available or self._last_server_check + 60 < int(time.time())
-
-    def _real_request_pot(
-        self,
-        request: PoTokenRequest,
-    ) -> PoTokenResponse:
-        if not self._check_server_availability(request):
-            raise PoTokenProviderRejectedRequest(
-                f'{self.PROVIDER_NAME} server is not available')
-
-        # used for CI check
-        self.logger.trace('Generating POT via HTTP server')
+        # answer from the last known state, the servers are probed before their first request and then
+        # in the background. Warming up asks for the background probes to start right away
+        if self._bool_config_arg('warm_up') or self._configuration_arg('warm_up_proxies', casesense=True):
+            self._start_health_check()
+        return any(backend.breaker.state != _CircuitBreaker.OPEN for backend in self._backends)
 
+    def _get_pot_data(self, request: PoTokenRequest) -> dict:
         disable_innertube = bool(self._configuration_arg('disable_innertube', default=[None])[0])
         challenge = self._get_attestation(None if disable_innertube else request.video_webpage)
         # The challenge is falsy when the webpage and the challenge are unavailable
@@ -122,42 +526,320 @@ class BgUtilHTTPPTP(BgUtilPTPBase):
                     'Pass disable_innertube=1 to suppress this warning.')
             disable_innertube = True
 
+        data = {
+            'bypass_cache': request.bypass_cache,
+            'challenge': challenge,
+            'content_binding': get_webpo_content_binding(request)[0],
+            'disable_innertube': disable_innertube,
+            'disable_tls_verification': not request.request_verify_tls,
+            'proxy': request.request_proxy,
+            'innertube_context': request.innertube_context,
+            'source_address': request.request_source_address,
+        }
+        data['hot'] = self._is_hot(data)
+        return data
+
+    def _warm_up_data(self, request: PoTokenRequest | None) -> dict:
+        data = self._networking_data(request)
+        # without an innertube context, /att/get can only fail
+        data['disable_innertube'] = not data.get('innertube_context') or bool(
+            self._configuration_arg('disable_innertube', default=[None])[0])
+        data['hot'] = self._is_hot(data, use=False)
+        return data
+
+    def _warm_up_backend(self, backend: _BgUtilBackend, data: dict) -> bool:
+        try:
+            response = json.load(backend.pool.request(
+                'POST', '/warmup', data=json.dumps(data).encode(),
+                headers={'Content-Type': 'application/json'}, timeout=self._GETPOT_TIMEOUT))
+        except Exception as e:
+            # older servers respond with 404
+            self.logger.debug(f'Failed to warm up {backend.base_url} (caused by {e!r})')
+            return False
+        if error_msg := response.get('error'):
+            self.logger.debug(f'Failed to warm up {backend.base_url}: {error_msg}')
+            return False
+        self.logger.debug(f'Warmed up {backend.base_url}, minter valid until {response.get("expiresAt")}')
+        return True
+
+    def _warm_up(self, request: PoTokenRequest | None) -> bool:
+        # every server may be asked for a token, so warm them all up
+        data = self._warm_up_data(request)
+        warmed = [
+            self._warm_up_backend(backend, data) for backend in self._backends
+            if backend.breaker.state != _CircuitBreaker.OPEN and self._check_version_once(backend)]
+        return any(warmed)
+
+    def _warm_up_backend_proxies(self, backend: _BgUtilBackend, proxies: list[str]) -> set[str]:
+        """@returns    The proxies whose minter is ready on the server"""
+        data = self._networking_data(None)
+        # listed to be warmed up, so meant to be used through the whole run
+        data.update({'proxies': proxies, 'disable_innertube': True, 'hot': self._keep_warm})
+        del data['proxy']
         try:
-            response = self._request_webpage(
-                request=Request(
-                    f'{self._base_url}/get_pot', data=json.dumps({
-                        'bypass_cache': request.bypass_cache,
-                        'challenge': challenge,
-                        'content_binding': get_webpo_content_binding(request)[0],
-                        'disable_innertube': disable_innertube,
-                        'disable_tls_verification': not request.request_verify_tls,
-                        'proxy': request.request_proxy,
-                        'innertube_context': request.innertube_context,
-                        'source_address': request.request_source_address,
-                    }).encode(), headers={'Content-Type': 'application/json'},
-                    extensions={'timeout': self._GETPOT_TIMEOUT}, proxies={'all': None}),
-                note=f'Generating a {request.context.value} PO Token for '
-                f'{request.internal_client_name} client via bgutil HTTP server',
-            )
+            response = json.load(backend.pool.request(
+                'POST', '/warmup_pools', data=json.dumps(data).encode(),
+                headers={'Content-Type': 'application/json'}, timeout=self._GETPOT_TIMEOUT * len(proxies)))
         except Exception as e:
+            # older servers respond with 404
+            self.logger.debug(f'Failed to warm up {backend.base_url} for {len(proxies)} proxies (caused by {e!r})')
+            return set()
+        warmed = set()
+        for result in traverse_obj(response, ('results', ..., {dict})):
+            if error_msg := result.get('error'):
+                self.logger.debug(f'Failed to warm up {backend.base_url} for a proxy: {error_msg}')
+            else:
+                warmed.add(result.get('proxy'))
+        self.logger.debug(f'Warmed up {backend.base_url} for {len(warmed)} of {len(proxies)} proxies')
+        return warmed
+
+    def _warm_up_proxies(self, proxies: list[str]) -> int:
+        with self._egress_lock:
+            self._listed_proxies.update(proxies)
+        # like _warm_up, any server may be asked for a token through any of the proxies
+        warmed = set()
+        for backend in self._backends:
+            if backend.breaker.state != _CircuitBreaker.OPEN and self._check_version_once(backend):
+                warmed |= self._warm_up_backend_proxies(backend, proxies)
+        return len(warmed)
+
+    @functools.cached_property
+    def _hedging(self) -> bool:
+        return self._bool_config_arg('hedge') and len(self._backends) > 1
+
+    @_locked_cached_property
+    def _hedge_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        # enough for every pooled connection to be busy
+        return concurrent.futures.ThreadPoolExecutor(
+            max_workers=sum(backend.pool.max_size for backend in self._backends),
+            thread_name_prefix='bgutil-hedge')
+
+    def _post_backend(self, backend: _BgUtilBackend, path: str, body: bytes) -> dict:
+        """POST to one server. Raises TransportError if the server could not be reached"""
+        try:
+            with backend.track(), self._metrics.timer('network', endpoint=path, backend=backend.base_url), \
+                    self._track_latency(path):
+                response = backend.pool.request(
+                    'POST', path, data=body, headers={'Content-Type': 'application/json'},
+                    timeout=self._adaptive_timeout(path, self._GETPOT_TIMEOUT))
+        except _ReadTimeoutError:
+            # the server is up but busy, e.g. creating a minter for a new egress
+            raise
+        except TransportError:
+            backend.breaker.record_failure()
+            raise
+        except Exception as e:
+            # the server responded, even if with an error
+            backend.breaker.record_success()
             raise PoTokenProviderError(
-                f'Error reaching POST /get_pot (caused by {e!r})') from e
+                f'Error reaching POST {backend.base_url}{path} (caused by {e!r})') from e
+        backend.breaker.record_success()
 
+        content = response.read()
         try:
-            response_json = json.load(response)
+            with self._metrics.timer('parse'):
+                response_json = json.loads(content)
         except Exception as e:
+            # the body was already read, and may be a large error page
             raise PoTokenProviderError(
-                f'Error parsing response JSON (caused by {e!r}). response = {response.read().decode()}') from e
+                f'Error parsing response JSON (caused by {e!r}). '
+                f'response = {content[:self._ERROR_RESPONSE_MAX_SIZE].decode(errors="replace")}') from e
 
         if error_msg := response_json.get('error'):
             raise PoTokenProviderError(error_msg)
+        return response_json
+
+    @staticmethod
+    def _egress_key(data: dict) -> str:
+        """The routing key of a request: what the servers key their minters by, not the content binding"""
+        return json.dumps([
+            data.get('proxy'), data.get('source_address'), data.get('disable_tls_verification'),
+            traverse_obj(data, ('innertube_context', 'client', 'remoteHost'))])
+
+    def _post_json(self, path: str, data: dict, routing_key: str | None = None) -> dict:
+        body = json.dumps(data).encode()
+        # the servers are only probed in the background once tokens are requested
+        self._start_health_check()
+        backends = (
+            backend for backend in self._selector.candidates(routing_key)
+            if backend.breaker.allow_request() and self._check_version_once(backend))
+        if self._hedging and (hedge_after := self._latencies.percentile(path, 95)) is not None:
+            return self._post_json_hedged(path, body, backends, hedge_after)
+
+        unreachable = None
+        for backend in backends:
+            if unreachable:
+                self.logger.debug(f'Failing over to {backend.base_url}')
+                self._metrics.inc('failovers')
+            try:
+                return self._post_backend(backend, path, body)
+            except TransportError as e:
+                unreachable = backend, e
+        self._raise_all_unreachable(path, unreachable)
+
+    def _post_json_hedged(self, path: str, body: bytes, backends: Iterable[_BgUtilBackend], hedge_after: float) -> dict:
+        """Like _post_json, but also ask the next server if the first one is slower than usual (p95)"""
+        pending: dict[concurrent.futures.Future, _BgUtilBackend] = {}
+        unreachable = error = None
+
+        def send_next() -> _BgUtilBackend | None:
+            for backend in backends:
+                pending[self._hedge_executor.submit(self._post_backend, backend, path, body)] = backend
+                return backend
+            return None
+
+        send_next()
+        while pending:
+            done, _ = concurrent.futures.wait(
+                pending, timeout=hedge_after, return_when=concurrent.futures.FIRST_COMPLETED)
+            if not done:
+                if backend := send_next():
+                    self.logger.debug(f'No answer after {hedge_after * 1000:.0f}ms, also asking {backend.base_url}')
+                    self._metrics.inc('hedged')
+                # only hedge once, then wait for the first answer
+                hedge_after = None
+                continue
+            for future in done:
+                backend = pending.pop(future)
+                try:
+                    return future.result()
+                except TransportError as e:
+                    unreachable = backend, e
+                except PoTokenProviderError as e:
+                    # another server may still succeed
+                    error = e
+            if not pending and unreachable and (backend := send_next()):
+                self.logger.debug(f'Failing over to {backend.base_url}')
+                self._metrics.inc('failovers')
+        if error:
+            raise error
+        self._raise_all_unreachable(path, unreachable)
+
+    def _raise_all_unreachable(self, path: str, unreachable: tuple[_BgUtilBackend, Exception] | None):
+        if unreachable:
+            backend, e = unreachable
+            self._raise_server_unreachable(backend.base_url, f'POST {backend.base_url}{path}', e)
+        raise PoTokenProviderRejectedRequest(
+            f'{self.PROVIDER_NAME} server is not available')
+
+    def _parse_pot_response(self, response_json: dict) -> PoTokenResponse:
         if 'poToken' not in response_json:
             raise PoTokenProviderError(
-                f'Server did not respond with a poToken. Received response: {response}')
+                f'Server did not respond with a poToken. Received response: {response_json}')
 
         po_token = response_json['poToken']
         self.logger.trace(f'Generated POT: {po_token}')
-        return PoTokenResponse(po_token=po_token)
+        return PoTokenResponse(po_token=po_token, expires_at=parse_iso8601(response_json.get('expiresAt')))
+
+    def _generate_pot(
+        self,
+        request: PoTokenRequest,
+    ) -> PoTokenResponse:
+        # used for CI check
+        self.logger.trace('Generating POT via HTTP server')
+
+        data = self._get_pot_data(request)
+        self.logger.info(
+            f'Generating a {request.context.value} PO Token for '
+            f'{request.internal_client_name} client via bgutil HTTP server')
+        return self._parse_pot_response(self._post_json('/get_pot', data, self._egress_key(data)))
+
+    def _check_request(self, request: PoTokenRequest):
+        """Reject a request like request_pot does before generating a token"""
+        if not self.is_available():
+            raise PoTokenProviderRejectedRequest(f'{self.PROVIDER_NAME} is not available')
+        if request.context not in self._SUPPORTED_CONTEXTS:
+            raise PoTokenProviderRejectedRequest(
+                f'PO Token Context "{request.context}" is not supported by {self.PROVIDER_NAME}')
+        client_name = traverse_obj(request.innertube_context, ('client', 'clientName'))
+        if client_name not in self._SUPPORTED_CLIENTS:
+            raise PoTokenProviderRejectedRequest(
+                f'Client "{client_name}" is not supported by {self.PROVIDER_NAME}. '
+                f'Supported clients: {", ".join(self._SUPPORTED_CLIENTS) or "none"}')
+        features = self._SUPPORTED_EXTERNAL_REQUEST_FEATURES
+        if request.request_proxy:
+            scheme = urllib.parse.urlparse(request.request_proxy).scheme
+            if getattr(ExternalRequestFeature, f'PROXY_SCHEME_{scheme.upper()}', None) not in features:
+                raise PoTokenProviderRejectedRequest(
+                    f'External requests by "{self.PROVIDER_NAME}" provider do not support proxy scheme "{scheme}"')
+        if request.request_source_address and ExternalRequestFeature.SOURCE_ADDRESS not in features:
+            raise PoTokenProviderRejectedRequest(
+                f'External requests by "{self.PROVIDER_NAME}" provider do not support setting source address')
+        if not request.request_verify_tls and ExternalRequestFeature.DISABLE_TLS_VERIFICATION not in features:
+            raise PoTokenProviderRejectedRequest(
+                f'External requests by "{self.PROVIDER_NAME}" provider '
+                'do not support ignoring TLS certificate failures')
+
+    def request_pot_batch(self, requests: list[PoTokenRequest]) -> list[PoTokenResponse | None]:
+        """
+        Generate PO tokens for many requests at once and store them in the plugin-side cache.
+        Requests sharing the same networking parameters are sent to the server in one round trip.
+        Each request is checked, cached and counted in the metrics like with request_pot.
+
+        @returns    A PoTokenResponse for each request, or None if no token could be generated for it
+        """
+        start = time.perf_counter()
+        responses: list[PoTokenResponse | None] = [None] * len(requests)
+        labels = [{
+            'context': request.context.value,
+            'client': request.internal_client_name,
+        } for request in requests]
+        batches: dict[tuple, list[int]] = {}
+        for idx, request in enumerate(requests):
+            try:
+                self._check_request(request)
+            except PoTokenProviderRejectedRequest as e:
+                self._metrics.inc('rejections', **labels[idx])
+                self.logger.debug(f'Not generating a PO Token for {get_webpo_content_binding(request)[0]}: {e}')
+                continue
+            cache_key = self._pot_cache_key(request)
+            if not request.bypass_cache and (cached := self._pot_cache.get(cache_key)):
+                self._metrics.inc('cache_hits', **labels[idx])
+                self._metrics.observe('request', time.perf_counter() - start, **labels[idx])
+                responses[idx] = PoTokenResponse(*cached)
+            elif cache_key[0]:
+                self._metrics.inc('cache_misses', **labels[idx])
+                # group by everything but the content binding, client and context
+                batch_key = (request.bypass_cache, request.request_verify_tls, *cache_key[3:])
+                batches.setdefault(batch_key, []).append(idx)
+
+        for indices in batches.values():
+            try:
+                data = self._get_pot_data(requests[indices[0]])
+                del data['content_binding']
+                data['content_bindings'] = list(dict.fromkeys(
+                    get_webpo_content_binding(requests[idx])[0] for idx in indices))
+                self.logger.info(
+                    f'Generating PO Tokens for {len(data["content_bindings"])} content bindings via bgutil HTTP server')
+                results = {
+                    result.get('contentBinding'): result
+                    for result in traverse_obj(
+                        self._post_json('/get_pot_batch', data, self._egress_key(data)), ('results', ..., {dict}))
+                }
+            except (PoTokenProviderRejectedRequest, PoTokenProviderError) as e:
+                # only the requests of this batch failed
+                metric = 'rejections' if isinstance(e, PoTokenProviderRejectedRequest) else 'errors'
+                for idx in indices:
+                    self._metrics.inc(metric, **labels[idx])
+                self.logger.warning(f'Failed to generate PO Tokens for {len(indices)} requests: {e}')
+                continue
+            for idx in indices:
+                request = requests[idx]
+                content_binding = get_webpo_content_binding(request)[0]
+                result = results.get(content_binding) or {'error': 'Missing from the server response'}
+                self._metrics.observe('request', time.perf_counter() - start, **labels[idx])
+                try:
+                    if error_msg := result.get('error'):
+                        raise PoTokenProviderError(error_msg)
+                    response = self._parse_pot_response(result)
+                except PoTokenProviderError as e:
+                    self._metrics.inc('errors', **labels[idx])
+                    self.logger.warning(f'Failed to generate a PO Token for {content_binding}: {e}')
+                    continue
+                self._pot_cache.store(self._pot_cache_key(request), response.po_token, response.expires_at)
+                responses[idx] = response
+
+        return responses
 
 
 @register_preference(BgUtilHTTPPTP)
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
 import abc
+import contextlib
 import functools
+import hashlib
 import json
 import os
 import re
+import shutil
 import subprocess
 import sys
 import sysconfig
+import threading
+import time
 from typing import Iterable, TypeVar
 
 from yt_dlp.extractor.youtube.pot.provider import (
@@ -18,13 +23,24 @@ from yt_dlp.extractor.youtube.pot.provider import (
     register_provider,
 )
 from yt_dlp.extractor.youtube.pot.utils import get_webpo_content_binding
-from yt_dlp.utils import Popen, int_or_none
+from yt_dlp.networking.exceptions import HTTPError, TransportError
+from yt_dlp.utils import (
+    LockingUnsupportedError,
+    Popen,
+    float_or_none,
+    int_or_none,
+    locked_file,
+    parse_iso8601,
+)
 from yt_dlp.utils.traversal import traverse_obj
 
-from yt_dlp_plugins.extractor.getpot_bgutil import BgUtilPTPBase
+from yt_dlp_plugins.extractor.getpot_bgutil import BgUtilPTPBase, _locked_cached_property
+from yt_dlp_plugins.extractor.getpot_bgutil_http import _BgUtilHTTPConnectionPool, _ReadTimeoutError
 
 T = TypeVar('T')
 _FALLBACK_PATHEXT = ('.COM', '.EXE', '.BAT', '.CMD')
+_LOG_CHUNK_SIZE = 64 * 1024
+_FRAME_HEADER_MAX_SIZE = 32
 
 
 # Copied from https://github.com/yt-dlp/yt-dlp/blob/891613b098b2b315d983c2ae16901f5de344ca56/yt_dlp/utils/_jsruntime.py#L16-L64
@@ -80,8 +96,237 @@ def _determine_runtime_path(path, basename):
     return path
 
 
+def _file_fingerprint(path: str) -> list | None:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [os.path.realpath(path), stat.st_mtime_ns, stat.st_size]
+
+
+def _forward_log(stream, logger, prefix: str):
+    """Pass the log lines of a script on to the trace log as they come, or discard them if it is disabled"""
+    if logger.log_level > logger.LogLevel.TRACE:
+        while stream.read(_LOG_CHUNK_SIZE):
+            pass
+        return
+    for line in stream:
+        if isinstance(line, bytes):
+            line = line.decode(errors='replace')
+        logger.trace(f'{prefix}: {line.rstrip()}')
+
+
+def _read_frame(stream) -> bytes:
+    """
+    Read the result of a script run with --framed: its length in bytes on a line, then the JSON.
+    Older scripts print their logs and then the result on the last line of stdout.
+    """
+    header = stream.readline(_FRAME_HEADER_MAX_SIZE)
+    if header.strip().isdigit():
+        return stream.read(int(header))
+    # only the frame header is capped, not the first line of an older script
+    last_line = header if header.endswith(b'\n') else header + stream.readline()
+    for line in stream:
+        if line.strip():
+            last_line = line
+    return last_line
+
+
+@contextlib.contextmanager
+def _file_lock(path: str, timeout: float):
+    """Hold an exclusive lock on a file shared with other processes. The OS releases it if the process is killed"""
+    deadline = time.monotonic() + timeout
+    while True:
+        # the file is left in place: once removed, another process could lock a new one while this one is held
+        lock = locked_file(path, 'ab', block=False)
+        try:
+            lock.open()
+            break
+        except LockingUnsupportedError:
+            # nothing to hold
+            lock = None
+            break
+        except BlockingIOError:
+            pass
+        if time.monotonic() >= deadline:
+            raise TimeoutError(f'{path} is still held after {timeout} seconds')
+        time.sleep(0.1)
+    try:
+        yield
+    finally:
+        if lock:
+            lock.close()
+
+
+class _ProbeCache:
+    """Results of the runtime and script probes, persisted across runs in a JSON file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict[str, list] | None = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> dict[str, list]:
+        if self._entries is None:
+            try:
+                with open(self.path, encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (OSError, ValueError):
+                self._entries = {}
+        return self._entries
+
+    def get(self, key: list) -> list | None:
+        with self._lock:
+            return self._load().get(json.dumps(key))
+
+    def store(self, key: list, value: list):
+        with self._lock:
+            entries = self._load()
+            entries[json.dumps(key)] = value
+            self._save(entries)
+
+    def _save(self, entries: dict[str, list]):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = f'{self.path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entries, f)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            pass
+
+
+class _ScriptTokenStore:
+    """
+    Reader of the token log shared by the script processes, see server/src/token_store.ts
+
+    The log is only ever appended to or moved aside as a whole, so the entries read so far
+    are kept and only the lines appended since the last read are parsed. The token that
+    expires last wins, as the lines of a compaction can be appended after newer ones.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict[str, tuple[str, int]] = {}
+        self._file_id: tuple[int, int] | None = None
+        self._offset = 0
+        self._lock = threading.Lock()
+
+    def get(self, content_binding: str) -> tuple[str, int] | None:
+        with self._lock:
+            self._refresh()
+            entry = self._entries.get(content_binding)
+        if entry and entry[1] > time.time():
+            return entry
+        return None
+
+    def _refresh(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            self._entries, self._file_id, self._offset = {}, None, 0
+            return
+        file_id = (stat.st_dev, stat.st_ino)
+        if file_id != self._file_id or stat.st_size < self._offset:
+            # compacted since the last read
+            self._entries, self._file_id, self._offset = {}, file_id, 0
+        if stat.st_size == self._offset:
+            return
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(self._offset)
+                data = f.read()
+        except OSError:
+            return
+        # leave a line that is still being written for the next read
+        data = data[:data.rfind(b'\n') + 1]
+        self._offset += len(data)
+        for line in data.splitlines():
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if not isinstance(entry, dict):
+                continue
+            content_binding, po_token = entry.get('contentBinding'), entry.get('poToken')
+            if not (content_binding and po_token and (expires_at := parse_iso8601(entry.get('expiresAt')))):
+                continue
+            if (cached := self._entries.get(content_binding)) is None or cached[1] < expires_at:
+                self._entries[content_binding] = (po_token, expires_at)
+
+
+class _BgUtilScriptWorker:
+    """A long-lived script process serving line-delimited JSON requests over stdin/stdout"""
+
+    def __init__(self, args: list[str], logger):
+        # only needed in persistent mode, don't import it when the plugin is loaded
+        import queue  # noqa: PLC0415
+
+        self._logger = logger
+        self._next_id = 0
+        self._lock = threading.Lock()
+        self._responses: queue.Queue[str | None] = queue.Queue()
+        self._proc = Popen(
+            args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE, text=True, bufsize=1)
+        threading.Thread(target=self._read_stdout, daemon=True).start()
+        threading.Thread(target=self._read_stderr, daemon=True).start()
+
+    def _read_stdout(self):
+        for line in self._proc.stdout:
+            self._responses.put(line)
+        self._responses.put(None)
+
+    def _read_stderr(self):
+        _forward_log(self._proc.stderr, self._logger, 'script worker')
+
+    @property
+    def alive(self) -> bool:
+        return self._proc.poll() is None
+
+    def request(self, payload: dict, timeout: float) -> dict:
+        """@raises TimeoutError    If the script did not respond in time"""
+        import queue  # noqa: PLC0415
+
+        # the script handles one request at a time
+        with self._lock:
+            self._next_id += 1
+            request_id = self._next_id
+            self._proc.stdin.write(json.dumps({**payload, 'id': request_id}) + '\n')
+            self._proc.stdin.flush()
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    line = self._responses.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    raise TimeoutError(f'script worker did not respond in {timeout} seconds') from None
+                if line is None:
+                    raise EOFError(f'script worker exited with returncode {self._proc.wait()}')
+                self._logger.trace(f'JSON response:\n{line.rstrip()}')
+                response = json.loads(line)
+                # skip responses to requests that have been given up on
+                if response.get('id') == request_id:
+                    return response
+
+    def close(self, timeout: float = 5.0):
+        if not self.alive:
+            return
+        try:
+            # the script saves its cache and exits when stdin is closed
+            self._proc.stdin.close()
+            self._proc.wait(timeout=timeout)
+        except (OSError, subprocess.TimeoutExpired):
+            self._proc.kill()
+            self._proc.wait()
+
+
 class BgUtilScriptPTPBase(BgUtilPTPBase, abc.ABC):
     _GET_SCRIPT_VSN_TIMEOUT = 15.0
+    _DAEMON_DEFAULT_IDLE_TIMEOUT = 600.0
+    _DAEMON_START_TIMEOUT = 30.0
+    _DAEMON_PING_TIMEOUT = 2.0
+    _DAEMON_POOL_SIZE = 4
+    _DAEMON_POOL_IDLE_TIMEOUT = 30.0
 
     @staticmethod
     def _jsrt_vsn_tup(v: str):
@@ -106,15 +351,37 @@ class BgUtilScriptPTPBase(BgUtilPTPBase, abc.ABC):
     def _jsrt_args(self) -> Iterable[str]:
         return ()
 
+    @_locked_cached_property
+    def _probe_cache(self) -> _ProbeCache | None:
+        if not self._bool_config_arg('probe_cache', default=True):
+            return None
+        return _ProbeCache(os.path.join(self._script_cache_dir, 'probe_cache.json'))
+
+    def _run_probe(self, key: list | None, args: list[str], **kwargs) -> tuple[str, int]:
+        """Run a version probe, or reuse the result of a previous run with the same key"""
+        if key and self._probe_cache and (cached := self._probe_cache.get(key)):
+            self.logger.trace(f'Using cached result of {" ".join(args)}')
+            return tuple(cached)
+        output, _, returncode = Popen.run(args, text=True, stdout=subprocess.PIPE, **kwargs)
+        output = output.strip()
+        # only successful probes are cached, failures may be temporary
+        if key and self._probe_cache and not returncode:
+            self._probe_cache.store(key, [output, returncode])
+        return output, returncode
+
+    @functools.cached_property
+    def _jsrt_fingerprint(self) -> list | None:
+        return self._jsrt_path and _file_fingerprint(shutil.which(self._jsrt_path) or self._jsrt_path)
+
     def _jsrt_path_impl(self) -> str | None:
         jsrt_path = _determine_runtime_path(
             traverse_obj(self.ie.get_param('js_runtimes'), (self._JSRT_EXEC, 'path')),
             self._JSRT_EXEC)
+        fingerprint = _file_fingerprint(shutil.which(jsrt_path) or jsrt_path)
         try:
-            output, _, returncode = Popen.run(
-                [jsrt_path, '--version'], text=True, stdin=subprocess.PIPE,
-                stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=5.0)
-            output = output.strip()
+            output, returncode = self._run_probe(
+                fingerprint and ['jsrt', *fingerprint], [jsrt_path, '--version'],
+                stdin=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=5.0)
         except subprocess.TimeoutExpired:
             self.logger.debug(
                 f'Failed to check {self._JSRT_NAME} version: {self._JSRT_NAME} process '
@@ -150,17 +417,21 @@ class BgUtilScriptPTPBase(BgUtilPTPBase, abc.ABC):
     def _script_path(self) -> str:
         return self._script_path_impl()
 
-    @functools.cached_property
+    @_locked_cached_property
     def _jsrt_path(self) -> str | None:
         return self._jsrt_path_impl()
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self._check_script = functools.cache(self._check_script_impl)
+        self._worker: _BgUtilScriptWorker | None = None
+        self._worker_lock = threading.Lock()
+        self._daemon_pool: _BgUtilHTTPConnectionPool | None = None
+        self._daemon_lock = threading.Lock()
 
-    def _base_config_arg(self, key: str, default: T = None) -> str | T:
+    def _base_config_arg(self, key: str, default: T = None, *, casesense: bool = False) -> str | T:
         return self.ie._configuration_arg(
-            ie_key='youtubepot-bgutilscript', key=key, default=[default])[0]
+            ie_key='youtubepot-bgutilscript', key=key, default=[default], casesense=casesense)[0]
 
     @functools.cached_property
     def _server_home(self) -> str:
@@ -190,7 +461,7 @@ class BgUtilScriptPTPBase(BgUtilPTPBase, abc.ABC):
             return self._server_home
 
     def is_available(self) -> bool:
-        return self._check_script(self._script_path)
+        return self._check_script(self._script_path) and (not self._daemon or bool(self._daemon_script_path))
 
     def _check_script_impl(self, script_path) -> bool:
         if not os.path.isfile(script_path):
@@ -204,10 +475,11 @@ class BgUtilScriptPTPBase(BgUtilPTPBase, abc.ABC):
             return False
         if not self._jsrt_path:
             return False
-        stdout, _, returncode = Popen.run(
-            [self._jsrt_path, *self._jsrt_args(), script_path, '--version'],
-            stdout=subprocess.PIPE, text=True, timeout=self._GET_SCRIPT_VSN_TIMEOUT)
-        stdout = stdout.strip()
+        command_args = [self._jsrt_path, *self._jsrt_args(), script_path, '--version']
+        script_digest = self._script_digest(script_path)
+        stdout, returncode = self._run_probe(
+            self._jsrt_fingerprint and script_digest and ['script', *self._jsrt_fingerprint, command_args, script_digest],
+            command_args, timeout=self._GET_SCRIPT_VSN_TIMEOUT)
         if returncode:
             self.logger.warning(
                 f'Failed to check script version. '
@@ -219,7 +491,64 @@ class BgUtilScriptPTPBase(BgUtilPTPBase, abc.ABC):
             self._check_version(stdout, name='script')
             return True
 
-    def _real_request_pot(
+    @staticmethod
+    def _script_digest(script_path: str) -> str | None:
+        # The version comes from the modules next to the script, hash all of them
+        script_dir = os.path.dirname(script_path)
+        ext = os.path.splitext(script_path)[1]
+        digest = hashlib.sha256()
+        try:
+            for name in sorted(os.listdir(script_dir)):
+                if name.endswith(ext):
+                    with open(os.path.join(script_dir, name), 'rb') as f:
+                        digest.update(name.encode())
+                        digest.update(f.read())
+        except OSError:
+            return None
+        return digest.hexdigest()
+
+    @_locked_cached_property
+    def _token_store(self) -> _ScriptTokenStore | None:
+        if not self._bool_config_arg('shared_cache', default=True):
+            return None
+        # Keep in sync with generate_once.ts
+        return _ScriptTokenStore(os.path.join(self._script_cache_dir, 'tokens.jsonl'))
+
+    @functools.cached_property
+    def _persistent(self) -> bool:
+        return self._bool_config_arg('persistent')
+
+    @functools.cached_property
+    def _daemon(self) -> bool:
+        return self._bool_config_arg('daemon')
+
+    @functools.cached_property
+    def _daemon_script_path(self) -> str | None:
+        # the server sits next to the script, and is built or not like it
+        script_dir, script_name = os.path.split(self._script_path)
+        daemon_script_path = os.path.join(script_dir, f'main{os.path.splitext(script_name)[1]}')
+        if not os.path.isfile(daemon_script_path):
+            self.logger.warning(
+                f"Server script doesn't exist: {daemon_script_path}. It is needed for daemon=1", once=True)
+            return None
+        return daemon_script_path
+
+    @functools.cached_property
+    def _daemon_lockfile(self) -> str:
+        # Written by the daemon, see --lockfile in main.ts
+        return os.path.join(self._script_cache_dir, 'daemon.json')
+
+    def close(self):
+        if self._worker:
+            self._worker.close()
+            self._worker = None
+        if self._daemon_pool:
+            # the daemon keeps running for the other yt-dlp processes, until it is idle
+            self._daemon_pool.close()
+            self._daemon_pool = None
+        super().close()
+
+    def _generate_pot(
         self,
         request: PoTokenRequest,
     ) -> PoTokenResponse:
@@ -227,6 +556,18 @@ class BgUtilScriptPTPBase(BgUtilPTPBase, abc.ABC):
         self.logger.trace(
             f'Generating POT via script: {self._script_path}')
 
+        # the script caches by content binding only, and so does the token store
+        if not request.bypass_cache and self._token_store and (
+                cached := self._token_store.get(get_webpo_content_binding(request)[0])):
+            self.logger.trace(f'Using POT from {self._token_store.path}')
+            self._metrics.inc('shared_cache_hits')
+            return PoTokenResponse(*cached)
+
+        if self._daemon:
+            return self._generate_pot_via_daemon(request)
+        if self._persistent:
+            return self._generate_pot_via_worker(request)
+
         command_args = [self._jsrt_path, *self._jsrt_args(), self._script_path]
         if proxy := request.request_proxy:
             command_args.extend(['-p', proxy])
@@ -247,11 +588,9 @@ class BgUtilScriptPTPBase(BgUtilPTPBase, abc.ABC):
             f'Executing command to get POT via script: {" ".join(command_args)}')
 
         try:
-            stdout, _, returncode = Popen.run(
-                command_args, stdout=subprocess.PIPE, text=True,
-                timeout=self._GETPOT_TIMEOUT)
-            stdout_lines = stdout.strip().splitlines()
-            json_resp = stdout_lines.pop()
+            with self._metrics.timer('subprocess'), self._track_latency('script'):
+                json_resp, returncode = self._run_script(
+                    [*command_args, '--framed'], timeout=self._adaptive_timeout('script', self._GETPOT_TIMEOUT))
         except subprocess.TimeoutExpired as e:
             raise PoTokenProviderError(
                 f'_get_pot_via_script failed: Timeout expired when trying to run script (caused by {e!r})')
@@ -259,23 +598,279 @@ class BgUtilScriptPTPBase(BgUtilPTPBase, abc.ABC):
             raise PoTokenProviderError(
                 f'_get_pot_via_script failed: Unable to run script (caused by {e!r})') from e
 
-        if stdout_extra := stdout_lines:
-            self.logger.trace(f'script stdout:\n{stdout_extra}')
+        try:
+            self.logger.trace(f'JSON response:\n{json_resp.decode(errors="replace")}')
+            with self._metrics.timer('parse'):
+                script_data_resp = json.loads(json_resp)
+        except json.JSONDecodeError as e:
+            if returncode:
+                raise PoTokenProviderError(
+                    f'_get_pot_via_script failed with returncode {returncode}') from e
+            raise PoTokenProviderError(
+                f'Error parsing JSON response from _get_pot_via_script (caused by {e!r})') from e
         if returncode:
             raise PoTokenProviderError(
-                f'_get_pot_via_script failed with returncode {returncode}')
-
+                f'_get_pot_via_script failed with returncode {returncode}'
+                + (f': {error_msg}' if (error_msg := traverse_obj(script_data_resp, ('error', {str}))) else ''))
+        return self._parse_script_response(script_data_resp)
+
+    def _run_script(self, command_args: list[str], timeout: float) -> tuple[bytes, int]:
+        """Run the script once. Its logs are streamed to the trace log as it runs, only the result is kept"""
+        proc = Popen(command_args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        threading.Thread(target=_forward_log, args=(proc.stderr, self.logger, 'script'), daemon=True).start()
+        timed_out = threading.Event()
+
+        def kill():
+            timed_out.set()
+            proc.kill()
+
+        # the result is read by this thread, kill the script if it does not arrive in time
+        watchdog = threading.Timer(timeout, kill)
+        watchdog.start()
+        try:
+            with proc.stdout:
+                json_resp = _read_frame(proc.stdout)
+            returncode = proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            watchdog.cancel()
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(command_args, timeout)
+        return json_resp, returncode
+
+    def _generate_pot_via_worker(self, request: PoTokenRequest) -> PoTokenResponse:
+        self.logger.info(
+            f'Generating a {request.context.value} PO Token for '
+            f'{request.internal_client_name} client via bgutil script worker',
+        )
+        return self._parse_script_response(self._worker_request({
+            'bypass_cache': request.bypass_cache,
+            'content_binding': get_webpo_content_binding(request)[0],
+            'disable_tls_verification': not request.request_verify_tls,
+            'proxy': request.request_proxy,
+            'source_address': request.request_source_address,
+        }))
+
+    def _worker_request(self, payload: dict) -> dict:
+        started = False
+        with self._worker_lock:
+            if not self._worker or not self._worker.alive:
+                command_args = [self._jsrt_path, *self._jsrt_args(), self._script_path, '--persistent']
+                self.logger.debug(
+                    f'Starting script worker: {" ".join(command_args)}')
+                try:
+                    self._worker = _BgUtilScriptWorker(command_args, self.logger)
+                except Exception as e:
+                    raise PoTokenProviderError(
+                        f'_get_pot_via_worker failed: Unable to start script worker (caused by {e!r})') from e
+                started = True
+            worker = self._worker
+
+        # the first request to a worker and warm-ups create a minter, which takes much longer
+        timeout = (
+            self._GETPOT_TIMEOUT * len(payload['warmup_proxies']) if payload.get('warmup_proxies')
+            else self._GETPOT_TIMEOUT if started or payload.get('warmup')
+            else self._adaptive_timeout('worker', self._GETPOT_TIMEOUT))
         try:
-            self.logger.trace(f'JSON response:\n{json_resp}')
-            # The JSON response is always the last line
-            script_data_resp = json.loads(json_resp)
+            with self._metrics.timer('subprocess'), self._track_latency('worker'):
+                script_data_resp = worker.request(payload, timeout=timeout)
+        except TimeoutError:
+            # the worker is in an unknown state, restart it on the next request
+            worker.close(timeout=0)
+            raise PoTokenProviderError(
+                f'_get_pot_via_worker failed: Script worker did not respond in {timeout} seconds')
         except json.JSONDecodeError as e:
             raise PoTokenProviderError(
-                f'Error parsing JSON response from _get_pot_via_script (caused by {e!r})') from e
+                f'Error parsing JSON response from _get_pot_via_worker (caused by {e!r})') from e
+        except Exception as e:
+            raise PoTokenProviderError(
+                f'_get_pot_via_worker failed: Unable to communicate with script worker (caused by {e!r})') from e
+
+        if error_msg := script_data_resp.get('error'):
+            raise PoTokenProviderError(error_msg)
+        return script_data_resp
+
+    def _connect_daemon(self) -> _BgUtilHTTPConnectionPool | None:
+        """Attach to the daemon in the lockfile, if it is running and on the version of the plugin"""
+        try:
+            with open(self._daemon_lockfile, encoding='utf-8') as f:
+                daemon_info = json.load(f)
+            base_url = daemon_info['url']
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        if daemon_info.get('version') != self.PROVIDER_VERSION:
+            self.logger.debug(
+                f'Not using the daemon with PID {daemon_info.get("pid")}, '
+                f'it is on a different version: {daemon_info.get("version")}')
+            return None
+        pool = _BgUtilHTTPConnectionPool(
+            base_url, max_size=self._DAEMON_POOL_SIZE, idle_timeout=self._DAEMON_POOL_IDLE_TIMEOUT)
+        try:
+            pool.request('GET', '/ping', timeout=self._DAEMON_PING_TIMEOUT)
+        except (TransportError, HTTPError):
+            pool.close()
+            return None
+        self.logger.trace(f'Using the daemon at {base_url}')
+        return pool
+
+    def _start_daemon(self) -> _BgUtilHTTPConnectionPool:
+        cache_dir = self._script_cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        idle_timeout = float_or_none(
+            self._base_config_arg('daemon_idle_timeout'), default=self._DAEMON_DEFAULT_IDLE_TIMEOUT)
+        command_args = [
+            self._jsrt_path, *self._jsrt_args(), self._daemon_script_path,
+            '--lockfile', self._daemon_lockfile, '--idle-timeout', str(idle_timeout)]
+        if os.name == 'nt':
+            # the port is chosen by the daemon and written to the lockfile
+            command_args.extend(['--host', '127.0.0.1', '--port', '0'])
+            detach_kwargs = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP}
+        else:
+            command_args.extend(['--socket', os.path.join(cache_dir, 'daemon.sock')])
+            detach_kwargs = {'start_new_session': True}
+
+        # yt-dlp processes started at the same time would all start a daemon otherwise
+        with _file_lock(os.path.join(cache_dir, 'daemon.lock'), timeout=self._DAEMON_START_TIMEOUT):
+            if pool := self._connect_daemon():
+                return pool
+            log_path = os.path.join(cache_dir, 'daemon.log')
+            self.logger.debug(f'Starting daemon: {" ".join(command_args)}')
+            with open(log_path, 'wb') as log:
+                proc = Popen(
+                    command_args, stdin=subprocess.DEVNULL, stdout=log, stderr=subprocess.STDOUT, **detach_kwargs)
+            deadline = time.monotonic() + self._DAEMON_START_TIMEOUT
+            while time.monotonic() < deadline:
+                if pool := self._connect_daemon():
+                    return pool
+                if proc.poll() is not None:
+                    raise PoTokenProviderError(
+                        f'The daemon exited with returncode {proc.returncode}, see {log_path}')
+                time.sleep(0.1)
+            proc.kill()
+            raise PoTokenProviderError(
+                f'The daemon did not start in {self._DAEMON_START_TIMEOUT} seconds, see {log_path}')
+
+    def _get_daemon_pool(self, reconnect: bool = False) -> tuple[_BgUtilHTTPConnectionPool, bool]:
+        """@returns    The connections to the daemon, and whether it has just been started"""
+        with self._daemon_lock:
+            if reconnect and self._daemon_pool:
+                self._daemon_pool.close()
+                self._daemon_pool = None
+            if self._daemon_pool:
+                return self._daemon_pool, False
+            if pool := self._connect_daemon():
+                self._daemon_pool = pool
+                return pool, False
+            try:
+                self._daemon_pool = self._start_daemon()
+            except PoTokenProviderError:
+                raise
+            except Exception as e:
+                raise PoTokenProviderError(
+                    f'_get_pot_via_daemon failed: Unable to start the daemon (caused by {e!r})') from e
+            return self._daemon_pool, True
+
+    def _daemon_request(self, path: str, payload: dict) -> dict:
+        body = json.dumps(payload).encode()
+        for reconnect in (False, True):
+            pool, started = self._get_daemon_pool(reconnect)
+            # the first request to a daemon and warm-ups create a minter, which takes much longer
+            timeout = (
+                self._GETPOT_TIMEOUT * len(payload['proxies']) if path == '/warmup_pools'
+                else self._GETPOT_TIMEOUT if started or path == '/warmup'
+                else self._adaptive_timeout('daemon', self._GETPOT_TIMEOUT))
+            try:
+                with self._metrics.timer('network', endpoint=path), self._track_latency('daemon'):
+                    response = pool.request(
+                        'POST', path, data=body, headers={'Content-Type': 'application/json'}, timeout=timeout)
+            except _ReadTimeoutError as e:
+                # the daemon is up but busy, sending the request again would only mint twice
+                raise PoTokenProviderError(
+                    f'_get_pot_via_daemon failed: Daemon did not respond in {timeout} seconds '
+                    f'(caused by {e!r})') from e
+            except TransportError as e:
+                # only a refused or reset connection or a missing socket means the daemon is gone
+                if reconnect or not isinstance(e.cause, (ConnectionError, FileNotFoundError)):
+                    raise PoTokenProviderError(
+                        f'_get_pot_via_daemon failed: Unable to reach the daemon (caused by {e!r})') from e
+                # the daemon may have exited because it was idle, start it again
+                self.logger.debug(f'Lost the connection to the daemon, reconnecting (caused by {e!r})')
+                continue
+            except HTTPError as e:
+                try:
+                    error_msg = json.load(e.response).get('error')
+                except Exception:
+                    error_msg = None
+                raise PoTokenProviderError(
+                    f'_get_pot_via_daemon failed: {error_msg or e}') from e
+            try:
+                with self._metrics.timer('parse'):
+                    return json.load(response)
+            except json.JSONDecodeError as e:
+                raise PoTokenProviderError(
+                    f'Error parsing JSON response from _get_pot_via_daemon (caused by {e!r})') from e
+
+    def _generate_pot_via_daemon(self, request: PoTokenRequest) -> PoTokenResponse:
+        self.logger.info(
+            f'Generating a {request.context.value} PO Token for '
+            f'{request.internal_client_name} client via bgutil daemon',
+        )
+        return self._parse_script_response(self._daemon_request('/get_pot', {
+            'bypass_cache': request.bypass_cache,
+            'content_binding': get_webpo_content_binding(request)[0],
+            # like the script, always use the /Create endpoint
+            'disable_innertube': True,
+            'disable_tls_verification': not request.request_verify_tls,
+            'proxy': request.request_proxy,
+            'source_address': request.request_source_address,
+        }))
+
+    def _warm_up(self, request: PoTokenRequest | None) -> bool:
+        if not self._persistent and not self._daemon:
+            self.logger.debug(
+                'Not warming up, every script run creates its own minter unless persistent=1 or daemon=1')
+            return False
+        data = self._networking_data(request)
+        # the script always uses the /Create endpoint
+        data.pop('innertube_context', None)
+        if self._daemon:
+            minter_info = self._daemon_request('/warmup', {**data, 'disable_innertube': True})
+        else:
+            minter_info = self._worker_request({'warmup': True, **data})
+        self.logger.debug(
+            f'Warmed up the script {"daemon" if self._daemon else "worker"}, '
+            f'minter valid until {minter_info.get("expiresAt")}')
+        return True
+
+    def _warm_up_proxies(self, proxies: list[str]) -> int:
+        if not self._persistent and not self._daemon:
+            self.logger.debug(
+                'Not warming up, every script run creates its own minter unless persistent=1 or daemon=1')
+            return 0
+        data = self._networking_data(None)
+        data.update({'proxies': proxies, 'disable_innertube': True})
+        del data['proxy']
+        if self._daemon:
+            response = self._daemon_request('/warmup_pools', data)
+        else:
+            data['warmup_proxies'] = data.pop('proxies')
+            response = self._worker_request(data)
+        warmed = [result for result in traverse_obj(response, ('results', ..., {dict})) if not result.get('error')]
+        self.logger.debug(
+            f'Warmed up the script {"daemon" if self._daemon else "worker"} '
+            f'for {len(warmed)} of {len(proxies)} proxies')
+        return len(warmed)
+
+    def _parse_script_response(self, script_data_resp: dict) -> PoTokenResponse:
         if 'poToken' not in script_data_resp:
             raise PoTokenProviderError(
                 'The script did not respond with a po_token')
-        return PoTokenResponse(po_token=script_data_resp['poToken'])
+        return PoTokenResponse(
+            po_token=script_data_resp['poToken'],
+            expires_at=parse_iso8601(script_data_resp.get('expiresAt')))
 
 
 @register_provider
@@ -0,0 +1,205 @@
+// How often the expired entries are swept, on the next get or set
+const SWEEP_INTERVAL_MS = 60 * 1000;
+// Rough size of a Map entry and the object holding the value
+const ENTRY_OVERHEAD_BYTES = 128;
+
+// Estimate the memory held by an entry from its strings, which are UTF-16
+export function estimateBytes(...strings: (string | undefined)[]): number {
+    return strings.reduce(
+        (total, string) => total + 2 * (string?.length || 0),
+        ENTRY_OVERHEAD_BYTES,
+    );
+}
+
+export type CacheLimits = {
+    maxEntries?: number;
+    maxBytes?: number;
+};
+
+export type CacheStats = {
+    entries: number;
+    bytes: number;
+    max_entries: number | null;
+    max_bytes: number | null;
+    evictions: number;
+    expirations: number;
+    hits: number;
+    misses: number;
+    hit_ratio: number | null;
+};
+
+// Add up the stats of several caches, e.g. those of the workers
+export function mergeCacheStats(stats: CacheStats[]): CacheStats {
+    const merged: CacheStats = {
+        entries: 0,
+        bytes: 0,
+        max_entries: null,
+        max_bytes: null,
+        evictions: 0,
+        expirations: 0,
+        hits: 0,
+        misses: 0,
+        hit_ratio: null,
+    };
+    for (const stat of stats) {
+        for (const key of [
+            "entries",
+            "bytes",
+            "evictions",
+            "expirations",
+            "hits",
+            "misses",
+        ] as const)
+            merged[key] += stat[key];
+        for (const key of ["max_entries", "max_bytes"] as const) {
+            const limit = stat[key];
+            if (limit !== null) merged[key] = (merged[key] || 0) + limit;
+        }
+    }
+    const lookups = merged.hits + merged.misses;
+    merged.hit_ratio = lookups ? merged.hits / lookups : null;
+    return merged;
+}
+
+type Entry<V> = {
+    value: V;
+    bytes: number;
+};
+
+// A Map that evicts the least recently used entries once it holds more than
+// maxEntries entries or maxBytes bytes, and drops the expired ones: on lookup,
+// and all of them at most every SWEEP_INTERVAL_MS. The sizes are estimates,
+// from the sizeOf of the owner, of what the entries keep alive.
+export class BoundedCache<V> {
+    // from the least to the most recently used
+    private entries = new Map<string, Entry<V>>();
+    private totalBytes = 0;
+    private lastSweep = Date.now();
+    private evictions = 0;
+    private expirations = 0;
+    private hits = 0;
+    private misses = 0;
+    public onDelete?: (key: string, value: V) => void;
+
+    constructor(
+        public limits: CacheLimits,
+        private expiresAt: (value: V) => Date,
+        private sizeOf: (key: string, value: V) => number,
+    ) {}
+
+    public get size(): number {
+        return this.entries.size;
+    }
+
+    public get bytes(): number {
+        return this.totalBytes;
+    }
+
+    private isExpired(value: V, now = new Date()): boolean {
+        return this.expiresAt(value) <= now;
+    }
+
+    // A valid entry, which becomes the most recently used one
+    public get(key: string): V | undefined {
+        this.sweepIfDue();
+        const entry = this.entries.get(key);
+        if (entry && this.isExpired(entry.value)) {
+            this.delete(key);
+            this.expirations++;
+        } else if (entry) {
+            this.entries.delete(key);
+            this.entries.set(key, entry);
+            this.hits++;
+            return entry.value;
+        }
+        this.misses++;
+        return undefined;
+    }
+
+    // Like get, but even if expired, and without changing the order or stats
+    public peek(key: string): V | undefined {
+        return this.entries.get(key)?.value;
+    }
+
+    // @returns The keys of the entries that were evicted to make room
+    public set(key: string, value: V): string[] {
+        this.sweepIfDue();
+        this.delete(key);
+        const bytes = this.sizeOf(key, value);
+        this.entries.set(key, { value, bytes });
+        this.totalBytes += bytes;
+
+        const { maxEntries, maxBytes } = this.limits;
+        const evicted: string[] = [];
+        for (const lruKey of this.entries.keys()) {
+            if (
+                (!maxEntries || this.entries.size <= maxEntries) &&
+                (!maxBytes || this.totalBytes <= maxBytes)
+            )
+                break;
+            // an entry larger than maxBytes on its own is still kept
+            if (lruKey === key) break;
+            this.delete(lruKey);
+            evicted.push(lruKey);
+        }
+        this.evictions += evicted.length;
+        return evicted;
+    }
+
+    public delete(key: string): boolean {
+        const entry = this.entries.get(key);
+        if (!entry) return false;
+        this.entries.delete(key);
+        this.totalBytes -= entry.bytes;
+        this.onDelete?.(key, entry.value);
+        return true;
+    }
+
+    public clear() {
+        for (const key of Array.from(this.entries.keys())) this.delete(key);
+    }
+
+    // Drop the expired entries
+    // @returns The number of entries that were dropped
+    public sweep(): number {
+        const now = new Date();
+        this.lastSweep = now.getTime();
+        let swept = 0;
+        for (const [key, entry] of Array.from(this.entries)) {
+            if (this.isExpired(entry.value, now)) {
+                this.delete(key);
+                swept++;
+            }
+        }
+        this.expirations += swept;
+        return swept;
+    }
+
+    private sweepIfDue() {
+        if (Date.now() - this.lastSweep >= SWEEP_INTERVAL_MS) this.sweep();
+    }
+
+    // Does not change the order of use
+    public entriesArray(): [string, V][] {
+        return Array.from(this.entries, ([key, entry]) => [key, entry.value]);
+    }
+
+    public keys(): string[] {
+        return Array.from(this.entries.keys());
+    }
+
+    public stats(): CacheStats {
+        const lookups = this.hits + this.misses;
+        return {
+            entries: this.entries.size,
+            bytes: this.totalBytes,
+            max_entries: this.limits.maxEntries || null,
+            max_bytes: this.limits.maxBytes || null,
+            evictions: this.evictions,
+            expirations: this.expirations,
+            hits: this.hits,
+            misses: this.misses,
+            hit_ratio: lookups ? this.hits / lookups : null,
+        };
+    }
+}
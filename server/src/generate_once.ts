@@ -1,8 +1,16 @@
-import { SessionManager, YoutubeSessionDataCaches } from "./session_manager.ts";
-import { VERSION } from "./utils.ts";
+import {
+    SessionManager,
+    YoutubeSessionData,
+    YoutubeSessionDataCaches,
+} from "./session_manager.ts";
+import { warmupProxies } from "./minter_pools.ts";
+import { MinterStore, restoreMinters } from "./minter_store.ts";
+import { TokenStore } from "./token_store.ts";
+import { strerror, VERSION } from "./utils.ts";
 import { Command } from "commander";
 import * as fs from "node:fs";
 import * as path from "node:path";
+import * as readline from "node:readline";
 
 // Follow XDG Base Directory Specification: https://specifications.freedesktop.org/basedir-spec/latest/
 let cachedir;
@@ -25,7 +33,11 @@ if (!fs.existsSync(cachedir)) {
         if (err) throw err;
     });
 }
-const CACHE_PATH = path.resolve(cachedir, "cache.json");
+// cache.json is the cache of older versions, migrated to the token store
+const LEGACY_CACHE_PATH = path.resolve(cachedir, "cache.json");
+// Keep in sync with the plugin, which reads it directly
+const tokenStore = new TokenStore(path.resolve(cachedir, "tokens.jsonl"));
+const minterStore = new MinterStore(path.resolve(cachedir, "minters"));
 
 const program = new Command()
     .option("-c, --content-binding <content-binding>")
@@ -35,6 +47,8 @@ const program = new Command()
     .option("-b, --bypass-cache")
     .option("-s, --source-address <source-address>")
     .option("--disable-tls-verification")
+    .option("--persistent")
+    .option("--framed")
     .option("--version")
     .option("--verbose")
     .exitOverride();
@@ -50,32 +64,12 @@ try {
 
 const options = program.opts();
 
-(async () => {
-    if (options.version) {
-        console.log(VERSION);
-        process.exit(0);
-    }
-    if (options.dataSyncId) {
-        console.error(
-            "Data sync id is deprecated, use --content-binding instead",
-        );
-        process.exit(1);
-    }
-    if (options.visitorData) {
-        console.error(
-            "Visitor data is deprecated, use --content-binding instead",
-        );
-        process.exit(1);
-    }
-
-    const contentBinding = options.contentBinding;
-    const proxy = options.proxy || "";
-    const verbose = options.verbose || false;
+function loadLegacyCache(): YoutubeSessionDataCaches {
     const cache: YoutubeSessionDataCaches = {};
-    if (fs.existsSync(CACHE_PATH)) {
+    if (fs.existsSync(LEGACY_CACHE_PATH)) {
         try {
             const parsedCaches = JSON.parse(
-                fs.readFileSync(CACHE_PATH, "utf8"),
+                fs.readFileSync(LEGACY_CACHE_PATH, "utf8"),
             );
             for (const contentBinding in parsedCaches) {
                 const parsedCache = parsedCaches[contentBinding];
@@ -97,11 +91,174 @@ const options = program.opts();
             console.warn(`Error parsing cache. e = ${e}`);
         }
     }
+    return cache;
+}
+
+function loadCache(): YoutubeSessionDataCaches {
+    try {
+        if (
+            fs.existsSync(LEGACY_CACHE_PATH) &&
+            !fs.existsSync(tokenStore.path)
+        ) {
+            for (const sessionData of Object.values(loadLegacyCache()))
+                tokenStore.append(sessionData);
+            fs.rmSync(LEGACY_CACHE_PATH, { force: true });
+        }
+    } catch (e) {
+        console.warn(`Error migrating ${LEGACY_CACHE_PATH}: ${strerror(e)}`);
+    }
+    return tokenStore.load();
+}
+
+function saveCache() {
+    try {
+        tokenStore.compact();
+    } catch (e) {
+        console.warn(
+            `Error writing cache. err.name = ${e.name}. err.message = ${e.message}. err.stack = ${e.stack}`,
+        );
+    }
+}
+
+// Generate a POT and add it to the token store, unless it came from the cache
+async function generatePoToken(
+    sessionManager: SessionManager,
+    ...args: Parameters<SessionManager["generatePoToken"]>
+): Promise<YoutubeSessionData> {
+    const [contentBinding] = args;
+    const cached =
+        contentBinding &&
+        sessionManager.getYoutubeSessionDataCaches()?.peek(contentBinding);
+    const sessionData = await sessionManager.generatePoToken(...args);
+    if (sessionData !== cached) {
+        try {
+            tokenStore.append(sessionData);
+        } catch (e) {
+            console.warn(`Error writing cache: ${strerror(e)}`);
+        }
+    }
+    return sessionData;
+}
+
+// With --framed, stdout only carries the result as a length-prefixed record:
+// its size in bytes on a line, then the JSON. Everything else goes to stderr.
+function writeResult(result: object) {
+    const payload = JSON.stringify(result);
+    if (options.framed)
+        process.stdout.write(`${Buffer.byteLength(payload)}\n${payload}`);
+    else console.log(payload);
+}
+
+// Serve line-delimited JSON requests from stdin until it is closed,
+// keeping the minters of the session manager alive between requests
+async function runPersistent(sessionManager: SessionManager) {
+    // stdout is reserved for responses, send everything else to stderr
+    const writeResponse = (resp: object) =>
+        process.stdout.write(JSON.stringify(resp) + "\n");
+    console.log = console.info = console.debug = console.error;
+
+    const onSignal = () => {
+        saveCache();
+        process.exit(0);
+    };
+    process.on("SIGINT", onSignal);
+    process.on("SIGTERM", onSignal);
+
+    // the minters of the previous runs are created while the first requests come in
+    restoreMinters(minterStore, sessionManager);
+
+    const lines = readline.createInterface({
+        input: process.stdin,
+        terminal: false,
+    });
+    for await (const line of lines) {
+        if (!line.trim()) continue;
+        let body: any;
+        try {
+            body = JSON.parse(line);
+        } catch (e) {
+            writeResponse({ error: `Invalid request: ${strerror(e)}` });
+            continue;
+        }
+        try {
+            if (body.warmup_proxies) {
+                const results = await warmupProxies(
+                    sessionManager,
+                    body.warmup_proxies,
+                    body.source_address,
+                    body.disable_tls_verification || false,
+                    true, // disableInnertube
+                    false, // hot
+                );
+                writeResponse({ id: body.id, results });
+                continue;
+            }
+            if (body.warmup) {
+                const minterInfo = await sessionManager.warmup(
+                    body.proxy || "",
+                    body.source_address,
+                    body.disable_tls_verification || false,
+                    true, // disableInnertube
+                );
+                writeResponse({ id: body.id, ...minterInfo });
+                continue;
+            }
+            const sessionData = await generatePoToken(
+                sessionManager,
+                body.content_binding,
+                body.proxy || "",
+                body.bypass_cache || false,
+                body.source_address,
+                body.disable_tls_verification || false,
+                undefined, // challenge
+                true, // disableInnertube
+                undefined, // innertubeContext
+            );
+            writeResponse({ id: body.id, ...sessionData });
+        } catch (e) {
+            writeResponse({ id: body.id, error: strerror(e) });
+        }
+    }
+    saveCache();
+}
+
+(async () => {
+    if (options.version) {
+        console.log(VERSION);
+        process.exit(0);
+    }
+    if (options.dataSyncId) {
+        console.error(
+            "Data sync id is deprecated, use --content-binding instead",
+        );
+        process.exit(1);
+    }
+    if (options.visitorData) {
+        console.error(
+            "Visitor data is deprecated, use --content-binding instead",
+        );
+        process.exit(1);
+    }
 
-    const sessionManager = new SessionManager(verbose, cache || {});
+    if (options.framed)
+        console.log = console.info = console.debug = console.error;
+
+    const contentBinding = options.contentBinding;
+    const proxy = options.proxy || "";
+    const verbose = options.verbose || false;
+    const sessionManager = new SessionManager(verbose, loadCache());
+
+    if (options.persistent) {
+        // a one-shot run exits before its minter could be restored, and many
+        // of them may run at once
+        sessionManager.minterStore = minterStore;
+        await runPersistent(sessionManager);
+        return;
+    }
 
     try {
-        const sessionData = await sessionManager.generatePoToken(
+        const sessionData = await generatePoToken(
+            sessionManager,
             contentBinding,
             proxy,
             options.bypassCache || false,
@@ -112,26 +269,13 @@ const options = program.opts();
             undefined, // innertubeContext
         );
 
-        try {
-            fs.writeFileSync(
-                CACHE_PATH,
-                JSON.stringify(
-                    sessionManager.getYoutubeSessionDataCaches(true),
-                ),
-                "utf8",
-            );
-        } catch (e) {
-            console.warn(
-                `Error writing cache. err.name = ${e.name}. err.message = ${e.message}. err.stack = ${e.stack}`,
-            );
-        } finally {
-            console.log(JSON.stringify(sessionData));
-        }
+        saveCache();
+        writeResult(sessionData);
     } catch (e) {
         console.error(
             `Failed while generating POT. err.name = ${e.name}. err.message = ${e.message}. err.stack = ${e.stack}`,
         );
-        console.log(JSON.stringify({}));
+        writeResult(options.framed ? { error: strerror(e) } : {});
         process.exit(1);
     }
 })();
@@ -1,59 +1,277 @@
-import { SessionManager } from "./session_manager.ts";
+import { Metrics, metrics } from "./metrics.ts";
+import { DEFAULT_MAX_MINTERS, warmupProxies } from "./minter_pools.ts";
+import { MinterStore, restoreMinters } from "./minter_store.ts";
+import { RefreshPolicy, SessionManager } from "./session_manager.ts";
 import { strerror, VERSION } from "./utils.ts";
+import { WorkerPool } from "./worker_pool.ts";
 import { Command } from "commander";
 import express from "express";
+import * as fs from "node:fs";
+import type { Server } from "node:http";
+import type { AddressInfo } from "node:net";
+import * as os from "node:os";
+import * as path from "node:path";
 
-const program = new Command().option("-p, --port <PORT>").parse();
+const program = new Command()
+    .option("-p, --port <PORT>")
+    .option("-s, --socket <PATH>")
+    .option("--host <HOST>")
+    .option("--lockfile <PATH>")
+    .option("--idle-timeout <SECONDS>")
+    .option("--keep-alive-timeout <SECONDS>")
+    .option("-w, --workers <N>")
+    .option("--minter-state <DIR>")
+    .option("--refresh-window <MINUTES>")
+    .option("--refresh-min-hits <N>")
+    .option("--max-minters <N>")
+    .parse();
 
 const options = program.opts();
 
 const PORT_NUMBER = options.port || 4416;
+// Keep idle connections from the plugin open long enough to be reused
+const KEEP_ALIVE_TIMEOUT_MS =
+    (options.keepAliveTimeout ? parseFloat(options.keepAliveTimeout) : 60) *
+    1000;
 
 const httpServer = express();
 httpServer.use(express.json());
 httpServer.use(express.urlencoded({ extended: true }));
 
-httpServer
-    .listen(
-        {
-            host: "::",
-            port: PORT_NUMBER,
-        },
-        (err) => {
-            if (err) {
-                console.error(
-                    `Could not listen on [::]:${PORT_NUMBER}, falling back to 0.0.0.0 (Caused by ${strerror(err)})`,
-                );
-            } else {
-                console.log(
-                    `Started POT server (v${VERSION}) on on address [::]:${PORT_NUMBER}`,
-                );
-            }
+// With --idle-timeout, exit once no request came in for this many seconds
+if (options.idleTimeout) {
+    const idleTimeoutMs = parseFloat(options.idleTimeout) * 1000;
+    let lastRequest = performance.now();
+    let inFlight = 0;
+    httpServer.use((request, response, next) => {
+        inFlight++;
+        response.on("close", () => {
+            inFlight--;
+            lastRequest = performance.now();
+        });
+        next();
+    });
+    setInterval(
+        () => {
+            if (inFlight || performance.now() - lastRequest < idleTimeoutMs)
+                return;
+            console.log(
+                `No requests for ${options.idleTimeout} seconds, exiting`,
+            );
+            process.exit(0);
         },
-    )
-    .on("error", () => {
-        // ipv4 only systems might not be able to bind to "::", so we try 0.0.0.0 instead
-        // this is temporary as we plan to bind to localhost in the next major version
-        httpServer.listen(
+        Math.max(Math.min(idleTimeoutMs / 4, 60 * 1000), 1000),
+    ).unref();
+}
+
+// With --lockfile, the PID, URL and version of the server are written to this
+// file once it listens, so that the plugin can find the server it started
+const lockfilePath = options.lockfile
+    ? path.resolve(options.lockfile)
+    : undefined;
+
+function writeLockfile(url: string) {
+    if (!lockfilePath) return;
+    try {
+        fs.mkdirSync(path.dirname(lockfilePath), { recursive: true });
+        const tmpPath = `${lockfilePath}.${process.pid}.tmp`;
+        fs.writeFileSync(
+            tmpPath,
+            JSON.stringify({ pid: process.pid, url, version: VERSION }),
+            { encoding: "utf8", mode: 0o600 },
+        );
+        fs.renameSync(tmpPath, lockfilePath);
+    } catch (e) {
+        console.error(`Could not write ${lockfilePath}: ${strerror(e)}`);
+        process.exit(1);
+    }
+}
+
+function ownsLockfile(): boolean {
+    try {
+        return (
+            JSON.parse(fs.readFileSync(lockfilePath!, "utf8")).pid ===
+            process.pid
+        );
+    } catch {
+        return false;
+    }
+}
+
+function tcpUrl(listening: Server, host: string): string {
+    const { port } = listening.address() as AddressInfo;
+    return `http://${host.includes(":") ? `[${host}]` : host}:${port}`;
+}
+
+const socketPath = options.socket ? path.resolve(options.socket) : undefined;
+if (socketPath || lockfilePath) {
+    process.on("exit", () => {
+        // a server started later may have taken over the socket and the lockfile
+        if (lockfilePath && !ownsLockfile()) return;
+        if (socketPath) fs.rmSync(socketPath, { force: true });
+        if (lockfilePath) fs.rmSync(lockfilePath, { force: true });
+    });
+    for (const signal of ["SIGINT", "SIGTERM"])
+        process.on(signal, () => process.exit(0));
+}
+
+let server: Server;
+if (socketPath) {
+    // remove the socket left behind by a previous server that did not exit cleanly
+    if (fs.existsSync(socketPath) && fs.statSync(socketPath).isSocket())
+        fs.unlinkSync(socketPath);
+    server = httpServer.listen(socketPath, (err) => {
+        if (err) {
+            console.error(
+                `Could not listen on ${socketPath} (Caused by ${strerror(err)})`,
+            );
+        } else {
+            console.log(
+                `Started POT server (v${VERSION}) on socket ${socketPath}`,
+            );
+            writeLockfile(`unix://${socketPath}`);
+        }
+    });
+} else if (options.host) {
+    const host: string = options.host;
+    server = httpServer.listen({ host, port: PORT_NUMBER }, (err) => {
+        if (err) {
+            console.error(
+                `Could not listen on ${host}:${PORT_NUMBER} (Caused by ${strerror(err)})`,
+            );
+        } else {
+            const url = tcpUrl(server, host);
+            console.log(`Started POT server (v${VERSION}) on ${url}`);
+            writeLockfile(url);
+        }
+    });
+} else {
+    server = httpServer
+        .listen(
             {
-                host: "0.0.0.0",
+                host: "::",
                 port: PORT_NUMBER,
             },
             (err) => {
                 if (err) {
                     console.error(
-                        `Could not listen on [::]:${PORT_NUMBER} (Caused by ${strerror(err)})`,
+                        `Could not listen on [::]:${PORT_NUMBER}, falling back to 0.0.0.0 (Caused by ${strerror(err)})`,
                     );
                 } else {
                     console.log(
-                        `Started POT server (v${VERSION}) on address 0.0.0.0:${PORT_NUMBER}`,
+                        `Started POT server (v${VERSION}) on on address [::]:${PORT_NUMBER}`,
                     );
+                    writeLockfile(tcpUrl(server, "127.0.0.1"));
                 }
             },
-        );
+        )
+        .on("error", () => {
+            // ipv4 only systems might not be able to bind to "::", so we try 0.0.0.0 instead
+            // this is temporary as we plan to bind to localhost in the next major version
+            const fallbackServer = httpServer.listen(
+                {
+                    host: "0.0.0.0",
+                    port: PORT_NUMBER,
+                },
+                (err) => {
+                    if (err) {
+                        console.error(
+                            `Could not listen on [::]:${PORT_NUMBER} (Caused by ${strerror(err)})`,
+                        );
+                    } else {
+                        console.log(
+                            `Started POT server (v${VERSION}) on address 0.0.0.0:${PORT_NUMBER}`,
+                        );
+                        writeLockfile(tcpUrl(fallbackServer, "127.0.0.1"));
+                    }
+                },
+            );
+            fallbackServer.keepAliveTimeout = KEEP_ALIVE_TIMEOUT_MS;
+        });
+}
+server.keepAliveTimeout = KEEP_ALIVE_TIMEOUT_MS;
+
+// With --workers, POTs are minted in worker threads instead of the main thread
+const WORKERS =
+    options.workers === "auto"
+        ? os.availableParallelism()
+        : parseInt(options.workers || "0");
+// With --minter-state, the minters are saved and created again on startup
+const minterStore = options.minterState
+    ? new MinterStore(path.resolve(options.minterState))
+    : undefined;
+// With --refresh-window, the minters that are still in use are created
+// again this many minutes before they expire
+const refreshPolicy: RefreshPolicy | undefined = options.refreshWindow
+    ? {
+          windowMs: parseFloat(options.refreshWindow) * 60 * 1000,
+          minHits: parseInt(options.refreshMinHits || "2"),
+      }
+    : undefined;
+// The least recently used minters are evicted once there are this many,
+// whatever their proxy or source address. 0 for no limit.
+const MAX_MINTERS = options.maxMinters
+    ? parseInt(options.maxMinters)
+    : DEFAULT_MAX_MINTERS;
+const workerPool =
+    WORKERS > 0
+        ? new WorkerPool(WORKERS, minterStore?.path, refreshPolicy, MAX_MINTERS)
+        : undefined;
+const sessionManager = workerPool || new SessionManager();
+if (workerPool) console.log(`Minting POTs in ${workerPool.size} workers`);
+if (sessionManager instanceof SessionManager) {
+    sessionManager.minterStore = minterStore;
+    sessionManager.refreshPolicy = refreshPolicy;
+    sessionManager.maxMinters = MAX_MINTERS;
+}
+if (minterStore)
+    restoreMinters(minterStore, sessionManager).then((restored) => {
+        if (restored.length)
+            console.log(
+                `Restored ${restored.length} minters from ${minterStore.path}`,
+            );
+    });
+
+if (refreshPolicy) {
+    let refreshing = false;
+    setInterval(
+        async () => {
+            // a refresh may take longer than the interval
+            if (refreshing) return;
+            refreshing = true;
+            try {
+                const refreshed = await sessionManager.refreshExpiring();
+                if (refreshed) console.log(`Refreshed ${refreshed} minters`);
+            } catch (e) {
+                console.error(`Failed to refresh minters: ${strerror(e)}`);
+            } finally {
+                refreshing = false;
+            }
+        },
+        Math.max(Math.min(refreshPolicy.windowMs / 2, 60 * 1000), 1000),
+    ).unref();
+}
+
+// Free the BotGuard VMs of the expired minters even when no request comes in
+setInterval(async () => {
+    try {
+        await sessionManager.cleanupCaches();
+    } catch (e) {
+        console.error(`Failed to clean up the caches: ${strerror(e)}`);
+    }
+}, 60 * 1000).unref();
+
+// Record the time spent serving each token endpoint
+httpServer.use(["/get_pot", "/get_pot_batch"], (request, response, next) => {
+    const start = performance.now();
+    response.on("finish", () => {
+        const labels = { endpoint: request.baseUrl };
+        metrics.observe("request", (performance.now() - start) / 1000, labels);
+        if (response.statusCode >= 400) metrics.inc("errors", labels);
     });
+    next();
+});
 
-const sessionManager = new SessionManager();
 httpServer.post("/get_pot", async (request, response) => {
     const body = request.body || {};
     if (body.data_sync_id)
@@ -81,6 +299,7 @@ httpServer.post("/get_pot", async (request, response) => {
             body.challenge,
             body.disable_innertube || false,
             body.innertube_context,
+            body.hot || false,
         );
 
         response.send(sessionData);
@@ -91,13 +310,100 @@ httpServer.post("/get_pot", async (request, response) => {
     }
 });
 
+httpServer.post("/get_pot_batch", async (request, response) => {
+    const body = request.body || {};
+    const contentBindings: string[] | undefined = body.content_bindings;
+    if (
+        !Array.isArray(contentBindings) ||
+        !contentBindings.length ||
+        !contentBindings.every((cb) => cb && typeof cb === "string")
+    )
+        return response.status(400).send({
+            error: "content_bindings must be a non-empty array of strings",
+        });
+    const proxy: string = body.proxy;
+    const bypassCache: boolean = body.bypass_cache || false;
+    const sourceAddress: string | undefined = body.source_address;
+    const disableTlsVerification: boolean =
+        body.disable_tls_verification || false;
+
+    try {
+        const results = await sessionManager.generatePoTokens(
+            contentBindings,
+            proxy,
+            bypassCache,
+            sourceAddress,
+            disableTlsVerification,
+            body.challenge,
+            body.disable_innertube || false,
+            body.innertube_context,
+            body.hot || false,
+        );
+
+        response.send({ results });
+    } catch (e) {
+        const msg = strerror(e, /*update=*/ true);
+        console.error(e.stack);
+        response.status(500).send({ error: msg });
+    }
+});
+
+httpServer.post("/warmup", async (request, response) => {
+    const body = request.body || {};
+    try {
+        const minterInfo = await sessionManager.warmup(
+            body.proxy,
+            body.source_address,
+            body.disable_tls_verification || false,
+            body.disable_innertube || false,
+            body.innertube_context,
+            body.challenge,
+            body.hot || false,
+        );
+
+        response.send(minterInfo);
+    } catch (e) {
+        const msg = strerror(e, /*update=*/ true);
+        console.error(e.stack);
+        response.status(500).send({ error: msg });
+    }
+});
+
+httpServer.post("/warmup_pools", async (request, response) => {
+    const body = request.body || {};
+    const proxies: string[] | undefined = body.proxies;
+    if (
+        !Array.isArray(proxies) ||
+        !proxies.length ||
+        !proxies.every((proxy) => typeof proxy === "string")
+    )
+        return response.status(400).send({
+            error: "proxies must be a non-empty array of strings",
+        });
+    if (MAX_MINTERS && proxies.length > MAX_MINTERS)
+        console.warn(
+            `Warming up ${proxies.length} proxies with --max-minters ${MAX_MINTERS}, the first ones will be evicted`,
+        );
+
+    const results = await warmupProxies(
+        sessionManager,
+        proxies,
+        body.source_address,
+        body.disable_tls_verification || false,
+        // without an innertube context, /att/get can only fail
+        body.disable_innertube ?? true,
+        body.hot || false,
+    );
+    response.send({ results });
+});
+
 httpServer.post("/invalidate_caches", async (request, response) => {
-    sessionManager.invalidateCaches();
+    await sessionManager.invalidateCaches();
     response.status(204).send();
 });
 
 httpServer.post("/invalidate_it", async (request, response) => {
-    sessionManager.invalidateIT();
+    await sessionManager.invalidateIT();
     response.status(204).send();
 });
 
@@ -108,7 +414,32 @@ httpServer.get("/ping", async (request, response) => {
     });
 });
 
+httpServer.get("/metrics", async (request, response) => {
+    let allMetrics = metrics;
+    if (workerPool) {
+        allMetrics = new Metrics();
+        allMetrics.merge(metrics.toJSON());
+        for (const snapshot of await workerPool.metrics())
+            allMetrics.merge(snapshot);
+    }
+    if (request.query.format === "json")
+        return response.send(allMetrics.toJSON());
+    response.type("text/plain; version=0.0.4").send(allMetrics.toPrometheus());
+});
+
+httpServer.get("/minter_pools", async (request, response) => {
+    response.send({
+        max_minters: MAX_MINTERS || null,
+        pools: await sessionManager.minterPoolSizes(),
+    });
+});
+
+httpServer.get("/cache_stats", async (request, response) => {
+    response.send(await sessionManager.cacheStats());
+});
+
 httpServer.get("/minter_cache", async (request, response) => {
-    console.debug(sessionManager.minterCache);
-    response.send(Array.from(sessionManager.minterCache.keys()));
+    if (sessionManager instanceof SessionManager)
+        console.debug(sessionManager.minterCache);
+    response.send(await sessionManager.minterCacheKeys());
 });
@@ -0,0 +1,137 @@
+type Labels = Record<string, string>;
+
+type Histogram = {
+    name: string;
+    labels: Labels;
+    buckets: number[];
+    count: number;
+    sum: number;
+};
+
+// Upper bounds in seconds, keep in sync with the plugin
+const BUCKETS = [
+    0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20,
+];
+
+function seriesKey(name: string, labels: Labels): string {
+    return JSON.stringify([name, Object.entries(labels).sort()]);
+}
+
+function formatLabels(labels: Labels): string {
+    const formatted = Object.entries(labels).map(
+        ([key, value]) =>
+            `${key}="${value.replace(/\\/g, "\\\\").replace(/"/g, '\\"').replace(/\n/g, "\\n")}"`,
+    );
+    return `{${formatted.join(",")}}`;
+}
+
+export class Metrics {
+    private counters = new Map<
+        string,
+        { name: string; labels: Labels; value: number }
+    >();
+    private histograms = new Map<string, Histogram>();
+
+    public inc(name: string, labels: Labels = {}, value = 1) {
+        const key = seriesKey(name, labels);
+        const counter = this.counters.get(key);
+        if (counter) counter.value += value;
+        else this.counters.set(key, { name, labels, value });
+    }
+
+    private getHistogram(name: string, labels: Labels): Histogram {
+        const key = seriesKey(name, labels);
+        const histogram = this.histograms.get(key) || {
+            name,
+            labels,
+            buckets: BUCKETS.map(() => 0),
+            count: 0,
+            sum: 0,
+        };
+        this.histograms.set(key, histogram);
+        return histogram;
+    }
+
+    public observe(name: string, seconds: number, labels: Labels = {}) {
+        const histogram = this.getHistogram(name, labels);
+        BUCKETS.forEach((bound, idx) => {
+            if (seconds <= bound) histogram.buckets[idx]!++;
+        });
+        histogram.count++;
+        histogram.sum += seconds;
+    }
+
+    // Time an async operation, whether or not it succeeds
+    public async time<T>(
+        name: string,
+        fn: () => Promise<T>,
+        labels: Labels = {},
+    ): Promise<T> {
+        const start = performance.now();
+        try {
+            return await fn();
+        } finally {
+            this.observe(name, (performance.now() - start) / 1000, labels);
+        }
+    }
+
+    public toJSON() {
+        return {
+            counters: Array.from(this.counters.values()),
+            histograms: Array.from(this.histograms.values()).map(
+                (histogram) => ({
+                    ...histogram,
+                    buckets: Object.fromEntries(
+                        BUCKETS.map((bound, idx) => [
+                            String(bound),
+                            histogram.buckets[idx],
+                        ]),
+                    ),
+                }),
+            ),
+        };
+    }
+
+    // Add the metrics of another instance, e.g. from a worker thread
+    public merge(snapshot: MetricsSnapshot) {
+        for (const { name, labels, value } of snapshot.counters)
+            this.inc(name, labels, value);
+        for (const histogram of snapshot.histograms) {
+            const merged = this.getHistogram(histogram.name, histogram.labels);
+            BUCKETS.forEach((bound, idx) => {
+                merged.buckets[idx]! += histogram.buckets[String(bound)] || 0;
+            });
+            merged.count += histogram.count;
+            merged.sum += histogram.sum;
+        }
+    }
+
+    public toPrometheus(prefix = "bgutil_server_"): string {
+        const lines: string[] = [];
+        for (const { name, labels, value } of this.counters.values())
+            lines.push(
+                `${prefix}${name}_total${formatLabels(labels)} ${value}`,
+            );
+        for (const histogram of this.histograms.values()) {
+            const name = `${prefix}${histogram.name}_seconds`;
+            const { labels } = histogram;
+            BUCKETS.forEach((bound, idx) =>
+                lines.push(
+                    `${name}_bucket${formatLabels({ ...labels, le: String(bound) })} ${histogram.buckets[idx]}`,
+                ),
+            );
+            lines.push(
+                `${name}_bucket${formatLabels({ ...labels, le: "+Inf" })} ${histogram.count}`,
+            );
+            lines.push(
+                `${name}_count${formatLabels(labels)} ${histogram.count}`,
+            );
+            lines.push(`${name}_sum${formatLabels(labels)} ${histogram.sum}`);
+        }
+        return lines.map((line) => `${line}\n`).join("");
+    }
+}
+
+export type MetricsSnapshot = ReturnType<Metrics["toJSON"]>;
+
+export const metrics = new Metrics();
@@ -0,0 +1,153 @@
+import { BoundedCache, CacheStats } from "./bounded_cache.ts";
+import type { MinterInfo, MinterSpec } from "./minter_store.ts";
+import type { SessionManager } from "./session_manager.ts";
+import { strerror } from "./utils.ts";
+
+// How many minters warmupProxies creates at once
+const WARMUP_CONCURRENCY = 4;
+// How many minters are kept unless maxMinters is set, 0 for no limit. Each one
+// holds a BotGuard VM, which its estimated size leaves out.
+export const DEFAULT_MAX_MINTERS = 100;
+
+// The number of minters in each pool, by egress key
+export type PoolSizes = { [egress: string]: number };
+
+// What YouTube sees a minter connect from: the proxy and the source address.
+// Minters for different IPs (remote hosts) through it share its pool.
+export function egressKey(
+    spec: Pick<MinterSpec, "proxy" | "sourceAddress">,
+): string {
+    return JSON.stringify([spec.proxy || "", spec.sourceAddress || ""]);
+}
+
+// The minters of a session manager, in one pool per egress. Once there are
+// maxMinters, the least recently used minter of any pool is evicted to make
+// room for a new one, so that rotating through many proxies does not keep a
+// BotGuard VM alive for each of them. Expired minters are dropped, see
+// BoundedCache.
+export class MinterPools<T extends { spec: MinterSpec; expiry: Date }> {
+    private minters: BoundedCache<T>;
+    private pools = new Map<string, Set<string>>();
+
+    constructor(sizeOf: (key: string, minter: T) => number) {
+        this.minters = new BoundedCache<T>(
+            { maxEntries: DEFAULT_MAX_MINTERS },
+            (minter) => minter.expiry,
+            sizeOf,
+        );
+        this.minters.onDelete = (key, minter) => {
+            const egress = egressKey(minter.spec);
+            const pool = this.pools.get(egress);
+            pool?.delete(key);
+            if (!pool?.size) this.pools.delete(egress);
+        };
+    }
+
+    public get maxMinters(): number {
+        return this.minters.limits.maxEntries || 0;
+    }
+
+    public set maxMinters(maxMinters: number) {
+        this.minters.limits.maxEntries = maxMinters;
+    }
+
+    public get size(): number {
+        return this.minters.size;
+    }
+
+    // A minter that has not expired
+    public get(key: string): T | undefined {
+        return this.minters.get(key);
+    }
+
+    public peek(key: string): T | undefined {
+        return this.minters.peek(key);
+    }
+
+    // @returns The keys of the minters that were evicted
+    public set(key: string, minter: T): string[] {
+        const evicted = this.minters.set(key, minter);
+        const egress = egressKey(minter.spec);
+        const pool = this.pools.get(egress) || new Set();
+        this.pools.set(egress, pool.add(key));
+        return evicted;
+    }
+
+    public delete(key: string): boolean {
+        return this.minters.delete(key);
+    }
+
+    public clear() {
+        this.minters.clear();
+    }
+
+    public sweep(): number {
+        return this.minters.sweep();
+    }
+
+    // Does not change the order of use
+    public entries(): [string, T][] {
+        return this.minters.entriesArray();
+    }
+
+    public keys(): string[] {
+        return this.minters.keys();
+    }
+
+    public stats(): CacheStats {
+        return this.minters.stats();
+    }
+
+    public poolSizes(): PoolSizes {
+        return Object.fromEntries(
+            Array.from(this.pools, ([egress, pool]) => [egress, pool.size]),
+        );
+    }
+}
+
+export type ProxyWarmupResult =
+    | (MinterInfo & { proxy: string })
+    | { proxy: string; error: string };
+
+// Create the minter of each proxy ahead of a job that rotates through them,
+// a few at a time. An empty proxy stands for a direct connection.
+export async function warmupProxies(
+    sessionManager: Pick<SessionManager, "warmup">,
+    proxies: string[],
+    sourceAddress: string | undefined,
+    disableTlsVerification: boolean,
+    disableInnertube: boolean,
+    hot: boolean,
+): Promise<ProxyWarmupResult[]> {
+    const results: ProxyWarmupResult[] = [];
+    let next = 0;
+    const warmupNext = async () => {
+        while (next < proxies.length) {
+            const idx = next++;
+            const proxy = proxies[idx]!;
+            try {
+                results[idx] = {
+                    proxy,
+                    ...(await sessionManager.warmup(
+                        proxy,
+                        sourceAddress,
+                        disableTlsVerification,
+                        disableInnertube,
+                        undefined,
+                        undefined,
+                        hot,
+                    )),
+                };
+            } catch (e) {
+                results[idx] = { proxy, error: strerror(e) };
+            }
+        }
+    };
+    await Promise.all(
+        Array.from(
+            { length: Math.min(WARMUP_CONCURRENCY, proxies.length) },
+            warmupNext,
+        ),
+    );
+    return results;
+}
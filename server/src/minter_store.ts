@@ -0,0 +1,118 @@
+import type { SessionManager } from "./session_manager.ts";
+import type { Context as InnertubeContext } from "youtubei.js";
+import { createHash } from "node:crypto";
+import * as fs from "node:fs";
+import * as path from "node:path";
+import { threadId } from "node:worker_threads";
+
+// What is needed to create the minter of a cache spec again
+export type MinterSpec = {
+    proxy: string;
+    sourceAddress?: string;
+    disableTlsVerification: boolean;
+    disableInnertube: boolean;
+    innertubeContext?: InnertubeContext;
+};
+
+export type MinterState = MinterSpec & {
+    expiry: Date;
+};
+
+export type MinterInfo = {
+    key: string;
+    expiresAt: Date;
+};
+
+// The minters of the session managers, saved so that they can be created
+// again before any traffic after a restart. Only what a minter was created
+// for and its expiry are saved: the WebPoMinter holds functions of the
+// BotGuard VM that only live as long as the process, so restoring a minter
+// still runs the challenge, but ahead of the first request instead of during
+// it.
+// Each minter is saved to a file of its own in the directory, named after the
+// hash of its cache key and replaced with a rename, so that the workers and
+// the processes sharing the directory never overwrite each other's minters.
+export class MinterStore {
+    constructor(public readonly path: string) {}
+
+    private statePath(key: string): string {
+        const hash = createHash("sha256").update(key).digest("hex");
+        return path.join(this.path, `${hash}.json`);
+    }
+
+    // The minters that have not expired yet
+    public load(): [string, MinterState][] {
+        let names: string[];
+        try {
+            names = fs.readdirSync(this.path);
+        } catch (e) {
+            if (e.code !== "ENOENT")
+                console.warn(`Error reading ${this.path}: ${e.message}`);
+            return [];
+        }
+        const states: [string, MinterState][] = [];
+        const now = new Date();
+        for (const name of names) {
+            if (!name.endsWith(".json")) continue;
+            const statePath = path.join(this.path, name);
+            try {
+                const { key, ...state } = JSON.parse(
+                    fs.readFileSync(statePath, "utf8"),
+                );
+                const expiry = new Date(state.expiry);
+                if (typeof key !== "string") throw new Error("No key");
+                if (expiry > now) states.push([key, { ...state, expiry }]);
+                // a minter saved again meanwhile would only not be restored
+                else fs.rmSync(statePath, { force: true });
+            } catch (e) {
+                console.warn(`Ignoring invalid ${statePath}: ${e.message}`);
+            }
+        }
+        return states;
+    }
+
+    public save(key: string, state: MinterState) {
+        fs.mkdirSync(this.path, { recursive: true, mode: 0o700 });
+        const statePath = this.statePath(key);
+        const tmpPath = `${statePath}.${process.pid}.${threadId}.tmp`;
+        // the proxies may include credentials
+        fs.writeFileSync(tmpPath, JSON.stringify({ key, ...state }), {
+            encoding: "utf8",
+            mode: 0o600,
+        });
+        fs.renameSync(tmpPath, statePath);
+    }
+
+    public remove(keys: string[]) {
+        for (const key of keys) fs.rmSync(this.statePath(key), { force: true });
+    }
+}
+
+// Create the minters saved in the store again, in the background.
+// Requests made meanwhile wait for these minters instead of creating others.
+export function restoreMinters(
+    store: MinterStore,
+    sessionManager: Pick<SessionManager, "warmup">,
+): Promise<MinterInfo[]> {
+    const restored: Promise<MinterInfo | null>[] = store
+        .load()
+        .map(([key, state]) =>
+            sessionManager
+                .warmup(
+                    state.proxy,
+                    state.sourceAddress,
+                    state.disableTlsVerification,
+                    state.disableInnertube,
+                    state.innertubeContext,
+                )
+                .catch((e) => {
+                    console.warn(
+                        `Failed to restore the minter for ${key}: ${e.message}`,
+                    );
+                    return null;
+                }),
+        );
+    return Promise.all(restored).then((infos) =>
+        infos.filter((info) => info !== null),
+    );
+}
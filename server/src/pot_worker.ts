@@ -0,0 +1,57 @@
+import { metrics } from "./metrics.ts";
+import { MinterStore } from "./minter_store.ts";
+import { SessionManager } from "./session_manager.ts";
+import { strerror } from "./utils.ts";
+import { parentPort, workerData } from "node:worker_threads";
+
+// Entry point of the worker threads started by WorkerPool, see worker_pool.ts
+export type WorkerRequest = {
+    id: number;
+    method: keyof typeof handlers;
+    args: any[];
+};
+
+export type WorkerResponse = {
+    id: number;
+    result?: any;
+    error?: string;
+};
+
+const sessionManager = new SessionManager();
+if (workerData?.minterStatePath)
+    sessionManager.minterStore = new MinterStore(workerData.minterStatePath);
+sessionManager.refreshPolicy = workerData?.refreshPolicy;
+if (workerData?.maxMinters !== undefined)
+    sessionManager.maxMinters = workerData.maxMinters;
+
+const handlers = {
+    generatePoToken: (...args: Parameters<SessionManager["generatePoToken"]>) =>
+        sessionManager.generatePoToken(...args),
+    generatePoTokens: (
+        ...args: Parameters<SessionManager["generatePoTokens"]>
+    ) => sessionManager.generatePoTokens(...args),
+    warmup: (...args: Parameters<SessionManager["warmup"]>) =>
+        sessionManager.warmup(...args),
+    invalidateCaches: () => sessionManager.invalidateCaches(),
+    invalidateIT: () => sessionManager.invalidateIT(),
+    refreshExpiring: () => sessionManager.refreshExpiring(),
+    cleanupCaches: () => sessionManager.cleanupCaches(),
+    minterCacheKeys: () => sessionManager.minterCacheKeys(),
+    minterPoolSizes: () => sessionManager.minterPoolSizes(),
+    cacheStats: () => sessionManager.cacheStats(),
+    metrics: () => metrics.toJSON(),
+};
+
+parentPort!.on("message", async ({ id, method, args }: WorkerRequest) => {
+    let response: WorkerResponse;
+    try {
+        const handler = handlers[method] as (...args: any[]) => any;
+        response = { id, result: await handler(...args) };
+    } catch (e) {
+        const msg = strerror(e, /*update=*/ true);
+        console.error(e.stack);
+        // the message now includes the causes, the main thread rebuilds the error
+        response = { id, error: e instanceof Error ? e.message : msg };
+    }
+    parentPort!.postMessage(response);
+});
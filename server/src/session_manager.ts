@@ -13,14 +13,23 @@ import { Agent } from "node:https";
 import { ProxyAgent } from "proxy-agent";
 import { JSDOM } from "jsdom";
 import { Innertube, Context as InnertubeContext } from "youtubei.js";
+import { BoundedCache, CacheStats, estimateBytes } from "./bounded_cache.ts";
+import { metrics } from "./metrics.ts";
+import { MinterPools, PoolSizes } from "./minter_pools.ts";
+import type { MinterInfo, MinterSpec, MinterStore } from "./minter_store.ts";
 import { strerror } from "./utils.ts";
 
-interface YoutubeSessionData {
+export interface YoutubeSessionData {
     poToken: string;
     contentBinding: string;
     expiresAt: Date;
 }
 
+export type BatchError = {
+    contentBinding: string;
+    error: string;
+};
+
 export interface YoutubeSessionDataCaches {
     [contentBinding: string]: YoutubeSessionData;
 }
@@ -140,9 +149,24 @@ type TokenMinter = {
     expiry: Date;
     integrityToken: string;
     minter: BG.WebPoMinter;
+    spec: MinterSpec;
+    // POTs minted since the minter was created,
+    // and whether a client asked to keep it warm
+    uses: number;
+    hot: boolean;
 };
 
-type MinterCache = Map<string, TokenMinter>;
+// The POT cache is only kept by the script, see setYoutubeSessionDataCaches
+export type SessionCacheStats = {
+    tokens: CacheStats | null;
+    minters: CacheStats;
+};
+
+// Create the hot minters again before they expire, see refreshExpiring
+export type RefreshPolicy = {
+    windowMs: number;
+    minHits: number;
+};
 
 export type ChallengeData = {
     interpreterUrl: {
@@ -158,19 +182,36 @@ export class SessionManager {
     // hardcoded API key that has been used by youtube for years
     private static readonly REQUEST_KEY = "O43z0dpjhgX20SCx4KAo";
     private static hasDom = false;
-    private _minterCache: MinterCache = new Map();
+    // the BotGuard VM of a minter is not counted, see --max-minters
+    private _minterCache = new MinterPools<TokenMinter>((key, tokenMinter) =>
+        estimateBytes(
+            key,
+            tokenMinter.integrityToken,
+            JSON.stringify(tokenMinter.spec),
+        ),
+    );
+    // Minters being created, shared by the requests made in the meantime
+    private _pendingMinters = new Map<string, Promise<TokenMinter>>();
+    public minterStore?: MinterStore;
+    public refreshPolicy?: RefreshPolicy;
     private TOKEN_TTL_HOURS: number;
+    private TOKEN_CACHE_MAX_MB: number;
     private logger: Logger;
+    // This needs to be reworked as POTs are IP-bound
+    private youtubeSessionDataCaches?: BoundedCache<YoutubeSessionData>;
 
     constructor(
         shouldLog = true,
-        // This needs to be reworked as POTs are IP-bound
-        private youtubeSessionDataCaches?: YoutubeSessionDataCaches,
+        youtubeSessionDataCaches?: YoutubeSessionDataCaches,
     ) {
         this.logger = new Logger(shouldLog);
         this.TOKEN_TTL_HOURS = process.env.TOKEN_TTL
             ? parseInt(process.env.TOKEN_TTL)
             : 6;
+        this.TOKEN_CACHE_MAX_MB = process.env.TOKEN_CACHE_MAX_MB
+            ? parseFloat(process.env.TOKEN_CACHE_MAX_MB)
+            : 64;
+        this.setYoutubeSessionDataCaches(youtubeSessionDataCaches);
         if (!SessionManager.hasDom) {
             const dom = new JSDOM(
                 '<!DOCTYPE html><html lang="en"><head><title></title></head><body></body></html>',
@@ -198,22 +239,58 @@ export class SessionManager {
     }
 
     public invalidateCaches() {
+        const keys = this._minterCache.keys();
         this.setYoutubeSessionDataCaches();
         this._minterCache.clear();
+        this.removeSavedMinters(keys);
     }
 
     public invalidateIT() {
-        this._minterCache.forEach((minterCache) => {
-            minterCache.expiry = new Date(0);
-        });
+        for (const [, tokenMinter] of this._minterCache.entries())
+            tokenMinter.expiry = new Date(0);
+        this.removeSavedMinters(this._minterCache.keys());
     }
 
-    public cleanupCaches() {
-        for (const contentBinding in this.youtubeSessionDataCaches) {
-            const sessionData = this.youtubeSessionDataCaches[contentBinding];
-            if (sessionData && new Date() > sessionData.expiresAt)
-                delete this.youtubeSessionDataCaches[contentBinding];
+    // Only the minters of this session manager, the store may be shared
+    private removeSavedMinters(keys: string[]) {
+        try {
+            this.minterStore?.remove(keys);
+        } catch (e) {
+            this.logger.warn(
+                `Failed to remove the minters from the minter store: ${strerror(e)}`,
+            );
+        }
+    }
+
+    private saveMinter(cacheSpec: CacheSpec, tokenMinter: TokenMinter) {
+        try {
+            this.minterStore?.save(cacheSpec.key, {
+                ...tokenMinter.spec,
+                expiry: tokenMinter.expiry,
+            });
+        } catch (e) {
+            this.logger.warn(`Failed to save the minter: ${strerror(e)}`);
+        }
+    }
+
+    // The live minters are capped across the pools of all egresses, see MinterPools
+    public set maxMinters(maxMinters: number) {
+        this._minterCache.maxMinters = maxMinters;
+    }
+
+    private cacheMinter(cacheSpec: CacheSpec, tokenMinter: TokenMinter) {
+        const evicted = this._minterCache.set(cacheSpec.key, tokenMinter);
+        for (const key of evicted) {
+            this.logger.log(`Evicted the least recently used minter ${key}`);
+            metrics.inc("minter_evictions");
         }
+        if (evicted.length) this.removeSavedMinters(evicted);
+    }
+
+    // Drop the expired POTs and minters, which is otherwise done every minute
+    public cleanupCaches() {
+        this.youtubeSessionDataCaches?.sweep();
+        this._minterCache.sweep();
     }
 
     public getYoutubeSessionDataCaches(cleanup = false) {
@@ -221,10 +298,31 @@ export class SessionManager {
         return this.youtubeSessionDataCaches;
     }
 
+    // The POTs are kept up to TOKEN_CACHE_MAX_MB, least recently used first out
     public setYoutubeSessionDataCaches(
         youtubeSessionData?: YoutubeSessionDataCaches,
     ) {
-        this.youtubeSessionDataCaches = youtubeSessionData;
+        if (!youtubeSessionData) {
+            this.youtubeSessionDataCaches = undefined;
+            return;
+        }
+        this.youtubeSessionDataCaches = new BoundedCache<YoutubeSessionData>(
+            { maxBytes: this.TOKEN_CACHE_MAX_MB * 1024 * 1024 },
+            (sessionData) => sessionData.expiresAt,
+            (contentBinding, sessionData) =>
+                estimateBytes(contentBinding, sessionData.poToken),
+        );
+        for (const [contentBinding, sessionData] of Object.entries(
+            youtubeSessionData,
+        ))
+            this.youtubeSessionDataCaches.set(contentBinding, sessionData);
+    }
+
+    public cacheStats(): SessionCacheStats {
+        return {
+            tokens: this.youtubeSessionDataCaches?.stats() || null,
+            minters: this._minterCache.stats(),
+        };
     }
 
     public async generateVisitorData(): Promise<string | null> {
@@ -238,10 +336,18 @@ export class SessionManager {
         return visitorData;
     }
 
-    public get minterCache(): MinterCache {
+    public get minterCache(): MinterPools<TokenMinter> {
         return this._minterCache;
     }
 
+    public minterCacheKeys(): string[] {
+        return this._minterCache.keys();
+    }
+
+    public minterPoolSizes(): PoolSizes {
+        return this._minterCache.poolSizes();
+    }
+
     private async getDescrambledChallenge(
         bgConfig: BgConfig,
         challenge?: ChallengeData,
@@ -322,12 +428,14 @@ export class SessionManager {
         innertubeContext?: InnertubeContext,
         disableInnertube?: boolean,
     ): Promise<TokenMinter> {
+        const start = performance.now();
         const descrambledChallenge = await this.getDescrambledChallenge(
             bgConfig,
             challenge,
             innertubeContext,
             disableInnertube,
         );
+        metrics.observe("challenge", (performance.now() - start) / 1000);
 
         const { program, globalName } = descrambledChallenge;
         const interpreterJavascript =
@@ -392,6 +500,7 @@ export class SessionManager {
                 `Generated IntegrityToken: ${JSON.stringify(integrityTokenData)}`,
             );
 
+            const { pxySpec } = cacheSpec;
             const tokenMinter: TokenMinter = {
                 expiry: new Date(Date.now() + estimatedTtlSecs * 1000),
                 integrityToken,
@@ -399,8 +508,22 @@ export class SessionManager {
                     integrityTokenData,
                     webPoSignalOutput,
                 ),
+                spec: {
+                    proxy: pxySpec.proxy || "",
+                    sourceAddress: pxySpec.sourceAddress,
+                    disableTlsVerification: pxySpec.disableTlsVerification,
+                    disableInnertube: disableInnertube || false,
+                    innertubeContext,
+                },
+                uses: 0,
+                hot: false,
             };
-            this._minterCache.set(cacheSpec.key, tokenMinter);
+            this.cacheMinter(cacheSpec, tokenMinter);
+            this.saveMinter(cacheSpec, tokenMinter);
+            metrics.observe(
+                "minter_creation",
+                (performance.now() - start) / 1000,
+            );
             return tokenMinter;
         } catch (e) {
             throw new Error(`Failed to generate an integrity token.`, {
@@ -412,11 +535,15 @@ export class SessionManager {
     private async tryMintPOT(
         contentBinding: string,
         tokenMinter: TokenMinter,
+        hot = false,
     ): Promise<YoutubeSessionData> {
         this.logger.log(`Generating POT for ${contentBinding}`);
+        tokenMinter.uses++;
+        if (hot) tokenMinter.hot = true;
         try {
-            const poToken =
-                await tokenMinter.minter.mintAsWebsafeString(contentBinding);
+            const poToken = await metrics.time("mint", () =>
+                tokenMinter.minter.mintAsWebsafeString(contentBinding),
+            );
             if (poToken) {
                 this.logger.log(`poToken: ${poToken}`);
                 const youtubeSessionData: YoutubeSessionData = {
@@ -426,12 +553,14 @@ export class SessionManager {
                         Date.now() + this.TOKEN_TTL_HOURS * 60 * 60 * 1000,
                     ),
                 };
-                if (this.youtubeSessionDataCaches)
-                    this.youtubeSessionDataCaches[contentBinding] =
-                        youtubeSessionData;
+                this.youtubeSessionDataCaches?.set(
+                    contentBinding,
+                    youtubeSessionData,
+                );
                 return youtubeSessionData;
             } else throw new Error("Unexpected empty POT");
         } catch (e) {
+            metrics.inc("mint_errors");
             throw new Error(
                 `Failed to mint POT for ${contentBinding}: ${e.message}`,
                 { cause: e },
@@ -481,28 +610,12 @@ export class SessionManager {
         };
     }
 
-    async generatePoToken(
-        contentBinding: string | undefined,
-        proxy: string = "",
-        bypassCache = false,
-        sourceAddress: string | undefined = undefined,
-        disableTlsVerification: boolean = false,
-        challenge: ChallengeData | undefined = undefined,
-        disableInnertube: boolean = false,
+    public static getCacheSpec(
+        proxy: string,
+        sourceAddress: string | undefined,
+        disableTlsVerification: boolean,
         innertubeContext?: InnertubeContext,
-    ): Promise<YoutubeSessionData> {
-        if (!contentBinding) {
-            this.logger.warn(
-                "No content binding provided, generating visitor data via Innertube...",
-            );
-            const visitorData = await this.generateVisitorData();
-            if (!visitorData)
-                throw new Error("Unable to generate visitor data");
-            contentBinding = visitorData;
-        }
-
-        this.cleanupCaches();
-
+    ): CacheSpec {
         const pxySpec = new ProxySpec({
             sourceAddress,
             disableTlsVerification,
@@ -516,53 +629,268 @@ export class SessionManager {
                 process.env.ALL_PROXY;
         }
 
-        const cacheSpec = new CacheSpec(
+        return new CacheSpec(
             pxySpec,
             innertubeContext?.client.remoteHost || null,
         );
+    }
 
-        const bgConfig: BgConfig = {
-            fetch: this.getFetch(pxySpec, 3, 5000),
+    private getBgConfig(cacheSpec: CacheSpec, identifier: string): BgConfig {
+        return {
+            fetch: this.getFetch(cacheSpec.pxySpec, 3, 5000),
             globalObj: globalThis,
-            identifier: contentBinding,
+            identifier,
             requestKey: SessionManager.REQUEST_KEY,
         };
+    }
 
+    private getCachedSessionData(
+        contentBinding: string,
+    ): YoutubeSessionData | undefined {
+        const sessionData = this.youtubeSessionDataCaches?.get(contentBinding);
+        if (sessionData)
+            this.logger.log(
+                `POT for ${contentBinding} still fresh, returning cached token`,
+            );
+        // the server does not cache POTs, there is nothing to count
+        if (this.youtubeSessionDataCaches)
+            metrics.inc(sessionData ? "cache_hits" : "cache_misses");
+        return sessionData;
+    }
+
+    private async getTokenMinter(
+        cacheSpec: CacheSpec,
+        bgConfig: BgConfig,
+        bypassCache: boolean,
+        challenge?: ChallengeData,
+        innertubeContext?: InnertubeContext,
+        disableInnertube?: boolean,
+    ): Promise<TokenMinter> {
         if (!bypassCache) {
-            if (this.youtubeSessionDataCaches) {
-                const sessionData =
-                    this.youtubeSessionDataCaches[contentBinding];
-                if (sessionData) {
-                    this.logger.log(
-                        `POT for ${contentBinding} still fresh, returning cached token`,
-                    );
-                    return sessionData;
-                }
-            }
-            let tokenMinter = this._minterCache.get(cacheSpec.key);
+            const previous = this._minterCache.peek(cacheSpec.key);
+            const tokenMinter = this._minterCache.get(cacheSpec.key);
             if (tokenMinter) {
-                // Replace minter if expired
-                if (new Date() >= tokenMinter.expiry) {
-                    this.logger.log("POT minter expired, getting a new one");
-                    tokenMinter = await this.generateTokenMinter(
-                        cacheSpec,
-                        bgConfig,
-                        challenge,
-                        innertubeContext,
-                        disableInnertube,
-                    );
-                }
-                return await this.tryMintPOT(contentBinding, tokenMinter);
+                metrics.inc("minter_cache_hits");
+                return tokenMinter;
             }
+            // Replace minter if expired
+            if (previous)
+                this.logger.log("POT minter expired, getting a new one");
+            const creating = this._pendingMinters.get(cacheSpec.key);
+            if (creating) return await creating;
         }
+        return await this.createTokenMinter(
+            cacheSpec,
+            bgConfig,
+            challenge,
+            innertubeContext,
+            disableInnertube,
+        );
+    }
 
-        const tokenMinter = await this.generateTokenMinter(
+    // Create a minter, shared with the requests made until it is ready.
+    // The previous minter for the cache spec keeps being used in the meantime.
+    private createTokenMinter(
+        cacheSpec: CacheSpec,
+        bgConfig: BgConfig,
+        challenge?: ChallengeData,
+        innertubeContext?: InnertubeContext,
+        disableInnertube?: boolean,
+    ): Promise<TokenMinter> {
+        const pending = this.generateTokenMinter(
             cacheSpec,
             bgConfig,
             challenge,
             innertubeContext,
             disableInnertube,
+        ).finally(() => {
+            if (this._pendingMinters.get(cacheSpec.key) === pending)
+                this._pendingMinters.delete(cacheSpec.key);
+        });
+        this._pendingMinters.set(cacheSpec.key, pending);
+        return pending;
+    }
+
+    // Create the minters that are about to expire again, if they minted at
+    // least minHits POTs or a client asked to keep them warm, so that the
+    // requests coming after the expiry do not wait for a BotGuard challenge.
+    // The new minters have to be used again to be refreshed in turn.
+    public async refreshExpiring(): Promise<number> {
+        if (!this.refreshPolicy) return 0;
+        const { windowMs, minHits } = this.refreshPolicy;
+        const refreshBefore = new Date(Date.now() + windowMs);
+        let refreshed = 0;
+        for (const [key, tokenMinter] of this._minterCache.entries()) {
+            if (
+                tokenMinter.expiry > refreshBefore ||
+                (!tokenMinter.hot && tokenMinter.uses < minHits) ||
+                this._pendingMinters.has(key)
+            )
+                continue;
+            const { spec } = tokenMinter;
+            const cacheSpec = SessionManager.getCacheSpec(
+                spec.proxy,
+                spec.sourceAddress,
+                spec.disableTlsVerification,
+                spec.innertubeContext,
+            );
+            this.logger.log(`Refreshing the POT minter for ${key}`);
+            try {
+                await this.createTokenMinter(
+                    cacheSpec,
+                    this.getBgConfig(
+                        cacheSpec,
+                        spec.innertubeContext?.client.visitorData || "",
+                    ),
+                    undefined,
+                    spec.innertubeContext,
+                    spec.disableInnertube,
+                );
+                metrics.inc("minter_refreshes");
+                refreshed++;
+            } catch (e) {
+                metrics.inc("minter_refresh_errors");
+                this.logger.warn(
+                    `Failed to refresh the POT minter for ${key}: ${strerror(e)}`,
+                );
+            }
+        }
+        return refreshed;
+    }
+
+    // Create the minter for these parameters ahead of the first POT
+    async warmup(
+        proxy: string = "",
+        sourceAddress: string | undefined = undefined,
+        disableTlsVerification: boolean = false,
+        disableInnertube: boolean = false,
+        innertubeContext?: InnertubeContext,
+        challenge?: ChallengeData,
+        hot = false,
+    ): Promise<MinterInfo> {
+        const cacheSpec = SessionManager.getCacheSpec(
+            proxy,
+            sourceAddress,
+            disableTlsVerification,
+            innertubeContext,
+        );
+        const tokenMinter = await this.getTokenMinter(
+            cacheSpec,
+            this.getBgConfig(
+                cacheSpec,
+                innertubeContext?.client.visitorData || "",
+            ),
+            false,
+            challenge,
+            innertubeContext,
+            disableInnertube,
+        );
+        if (hot) tokenMinter.hot = true;
+        return { key: cacheSpec.key, expiresAt: tokenMinter.expiry };
+    }
+
+    async generatePoToken(
+        contentBinding: string | undefined,
+        proxy: string = "",
+        bypassCache = false,
+        sourceAddress: string | undefined = undefined,
+        disableTlsVerification: boolean = false,
+        challenge: ChallengeData | undefined = undefined,
+        disableInnertube: boolean = false,
+        innertubeContext?: InnertubeContext,
+        hot = false,
+    ): Promise<YoutubeSessionData> {
+        if (!contentBinding) {
+            this.logger.warn(
+                "No content binding provided, generating visitor data via Innertube...",
+            );
+            const visitorData = await this.generateVisitorData();
+            if (!visitorData)
+                throw new Error("Unable to generate visitor data");
+            contentBinding = visitorData;
+        }
+
+        const cacheSpec = SessionManager.getCacheSpec(
+            proxy,
+            sourceAddress,
+            disableTlsVerification,
+            innertubeContext,
+        );
+
+        if (!bypassCache) {
+            const sessionData = this.getCachedSessionData(contentBinding);
+            if (sessionData) return sessionData;
+        }
+
+        const tokenMinter = await this.getTokenMinter(
+            cacheSpec,
+            this.getBgConfig(cacheSpec, contentBinding),
+            bypassCache,
+            challenge,
+            innertubeContext,
+            disableInnertube,
         );
-        return await this.tryMintPOT(contentBinding, tokenMinter);
+        return await this.tryMintPOT(contentBinding, tokenMinter, hot);
+    }
+
+    // Mint POTs for many content bindings with a shared minter
+    async generatePoTokens(
+        contentBindings: string[],
+        proxy: string = "",
+        bypassCache = false,
+        sourceAddress: string | undefined = undefined,
+        disableTlsVerification: boolean = false,
+        challenge: ChallengeData | undefined = undefined,
+        disableInnertube: boolean = false,
+        innertubeContext?: InnertubeContext,
+        hot = false,
+    ): Promise<(YoutubeSessionData | BatchError)[]> {
+        const cacheSpec = SessionManager.getCacheSpec(
+            proxy,
+            sourceAddress,
+            disableTlsVerification,
+            innertubeContext,
+        );
+
+        const results: (YoutubeSessionData | BatchError)[] = [];
+        const pending: number[] = [];
+        contentBindings.forEach((contentBinding, idx) => {
+            const sessionData =
+                !bypassCache && this.getCachedSessionData(contentBinding);
+            if (sessionData) results[idx] = sessionData;
+            else pending.push(idx);
+        });
+        if (!pending.length) return results;
+
+        let tokenMinter: TokenMinter;
+        try {
+            tokenMinter = await this.getTokenMinter(
+                cacheSpec,
+                this.getBgConfig(cacheSpec, contentBindings[pending[0]!]!),
+                bypassCache,
+                challenge,
+                innertubeContext,
+                disableInnertube,
+            );
+        } catch (e) {
+            const error = strerror(e);
+            for (const idx of pending)
+                results[idx] = { contentBinding: contentBindings[idx]!, error };
+            return results;
+        }
+
+        for (const idx of pending) {
+            const contentBinding = contentBindings[idx]!;
+            try {
+                results[idx] = await this.tryMintPOT(
+                    contentBinding,
+                    tokenMinter,
+                    hot,
+                );
+            } catch (e) {
+                results[idx] = { contentBinding, error: strerror(e) };
+            }
+        }
+        return results;
     }
 }
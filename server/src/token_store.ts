@@ -0,0 +1,121 @@
+import type {
+    YoutubeSessionData,
+    YoutubeSessionDataCaches,
+} from "./session_manager.ts";
+import * as fs from "node:fs";
+import * as path from "node:path";
+
+// Compact when at least this many lines are stale or expired
+const COMPACT_MIN_STALE_LINES = 100;
+// Times an append is written again when the log keeps being moved aside
+const APPEND_RETRIES = 3;
+
+function toLine({ contentBinding, poToken, expiresAt }: YoutubeSessionData) {
+    return JSON.stringify({ contentBinding, poToken, expiresAt });
+}
+
+// POT cache shared by all the script processes, as a log of JSON lines.
+// New tokens are appended and the token that expires last wins, so the order
+// of the lines does not matter. Nobody takes a lock, neither the writers nor
+// the readers (including the plugin):
+// - appends are single O_APPEND writes of whole lines, so readers only have
+//   to skip a trailing partial line
+// - compaction moves the log aside and appends its valid tokens to a new log,
+//   so the tokens appended in the meantime are kept
+// - an append that went to a log after it was moved aside is written again
+export class TokenStore {
+    private lines = 0;
+
+    constructor(public readonly path: string) {}
+
+    public load(): YoutubeSessionDataCaches {
+        return this.read(this.path);
+    }
+
+    private read(logPath: string): YoutubeSessionDataCaches {
+        const caches: YoutubeSessionDataCaches = {};
+        let content: string;
+        try {
+            content = fs.readFileSync(logPath, "utf8");
+        } catch (e) {
+            if (e.code !== "ENOENT")
+                console.warn(`Error reading ${logPath}: ${e.message}`);
+            return caches;
+        }
+        const now = new Date();
+        this.lines = 0;
+        for (const line of content.split("\n")) {
+            if (!line) continue;
+            this.lines++;
+            let entry: any;
+            try {
+                entry = JSON.parse(line);
+            } catch {
+                // being written by another process, or truncated by a crash
+                continue;
+            }
+            const expiresAt = new Date(entry?.expiresAt);
+            const { contentBinding, poToken } = entry || {};
+            if (!contentBinding || !poToken || isNaN(expiresAt.getTime()))
+                continue;
+            const cached = caches[contentBinding];
+            if (expiresAt > now && !(cached && cached.expiresAt >= expiresAt))
+                caches[contentBinding] = { contentBinding, poToken, expiresAt };
+        }
+        return caches;
+    }
+
+    private write(lines: string[]) {
+        if (!lines.length) return;
+        fs.mkdirSync(path.dirname(this.path), { recursive: true });
+        const data = lines.map((line) => `${line}\n`).join("");
+        for (let attempt = 0; ; attempt++) {
+            const fd = fs.openSync(this.path, "a", 0o600);
+            let written: fs.Stats;
+            try {
+                fs.writeSync(fd, data);
+                written = fs.fstatSync(fd);
+            } finally {
+                fs.closeSync(fd);
+            }
+            let current: fs.Stats | undefined;
+            try {
+                current = fs.statSync(this.path);
+            } catch (e) {
+                if (e.code !== "ENOENT") throw e;
+            }
+            // Still the log: a compaction moving it aside from now on reads
+            // the lines. Otherwise the lines may have been written after it
+            // was moved aside and read, so write them to the new log too.
+            if (current?.ino === written.ino && current.dev === written.dev)
+                return;
+            if (attempt >= APPEND_RETRIES)
+                throw new Error(`${this.path} kept being moved aside`);
+        }
+    }
+
+    public append(sessionData: YoutubeSessionData) {
+        this.write([toLine(sessionData)]);
+        this.lines++;
+    }
+
+    // Rewrite the log with only the valid tokens, if enough lines are stale
+    public compact(force = false) {
+        const entries = Object.values(this.load());
+        if (!force && this.lines - entries.length < COMPACT_MIN_STALE_LINES)
+            return;
+        const asidePath = `${this.path}.${process.pid}.compact`;
+        try {
+            fs.renameSync(this.path, asidePath);
+        } catch (e) {
+            // moved aside by another process in the meantime
+            if (e.code === "ENOENT") return;
+            throw e;
+        }
+        // read it again, for the lines appended since it was loaded
+        const valid = Object.values(this.read(asidePath));
+        this.write(valid.map(toLine));
+        fs.rmSync(asidePath, { force: true });
+        this.lines = valid.length;
+    }
+}
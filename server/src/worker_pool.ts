@@ -0,0 +1,237 @@
+import { mergeCacheStats } from "./bounded_cache.ts";
+import type { MetricsSnapshot } from "./metrics.ts";
+import type { PoolSizes } from "./minter_pools.ts";
+import type { MinterInfo } from "./minter_store.ts";
+import type { WorkerRequest, WorkerResponse } from "./pot_worker.ts";
+import {
+    BatchError,
+    RefreshPolicy,
+    SessionCacheStats,
+    SessionManager,
+    YoutubeSessionData,
+} from "./session_manager.ts";
+import { strerror } from "./utils.ts";
+import * as path from "node:path";
+import { fileURLToPath } from "node:url";
+import { Worker } from "node:worker_threads";
+
+type PendingCall = {
+    resolve: (result: any) => void;
+    reject: (error: Error) => void;
+};
+
+// The worker sits next to this file: .js when built with tsc, .ts with deno
+const WORKER_URL = new URL(
+    `./pot_worker${path.extname(fileURLToPath(import.meta.url))}`,
+    import.meta.url,
+);
+
+// FNV-1a, only used to spread the cache keys over the workers
+function hashKey(key: string): number {
+    let hash = 0x811c9dc5;
+    for (let i = 0; i < key.length; i++) {
+        hash ^= key.charCodeAt(i);
+        hash = Math.imul(hash, 0x01000193);
+    }
+    return hash >>> 0;
+}
+
+class PoolWorker {
+    private worker!: Worker;
+    private nextId = 0;
+    private pending = new Map<number, PendingCall>();
+    private closed = false;
+
+    constructor(
+        public readonly index: number,
+        private minterStatePath?: string,
+        private refreshPolicy?: RefreshPolicy,
+        private maxMinters?: number,
+    ) {
+        this.start();
+    }
+
+    private start() {
+        this.worker = new Worker(WORKER_URL, {
+            workerData: {
+                minterStatePath: this.minterStatePath,
+                refreshPolicy: this.refreshPolicy,
+                maxMinters: this.maxMinters,
+            },
+        });
+        this.worker.on("message", ({ id, result, error }: WorkerResponse) => {
+            const call = this.pending.get(id);
+            if (!call) return;
+            this.pending.delete(id);
+            if (error !== undefined) call.reject(new Error(error));
+            else call.resolve(result);
+        });
+        this.worker.on("error", (e) => {
+            console.error(`Worker ${this.index} failed: ${strerror(e)}`);
+        });
+        this.worker.on("exit", (code) => {
+            for (const call of this.pending.values())
+                call.reject(
+                    new Error(`Worker ${this.index} exited with code ${code}`),
+                );
+            this.pending.clear();
+            if (this.closed) return;
+            // the minters of this worker are lost, the next requests create new ones
+            console.warn(`Restarting worker ${this.index}`);
+            this.start();
+        });
+    }
+
+    public call<T>(method: WorkerRequest["method"], args: any[]): Promise<T> {
+        return new Promise((resolve, reject) => {
+            const id = this.nextId++;
+            this.pending.set(id, { resolve, reject });
+            const request: WorkerRequest = { id, method, args };
+            this.worker.postMessage(request);
+        });
+    }
+
+    public async close() {
+        this.closed = true;
+        await this.worker.terminate();
+    }
+}
+
+// Spreads the minting over worker threads, each with its own SessionManager.
+// Requests with the same cache spec (IP or proxy) always go to the same worker,
+// so that its minter is created once and stays warm.
+export class WorkerPool {
+    private workers: PoolWorker[];
+
+    constructor(
+        size: number,
+        minterStatePath?: string,
+        refreshPolicy?: RefreshPolicy,
+        maxMinters?: number,
+    ) {
+        // the maximum is for the whole server, each worker gets its share
+        const workerMaxMinters =
+            maxMinters !== undefined ? Math.ceil(maxMinters / size) : undefined;
+        this.workers = Array.from(
+            { length: size },
+            (_, i) =>
+                new PoolWorker(
+                    i,
+                    minterStatePath,
+                    refreshPolicy,
+                    workerMaxMinters,
+                ),
+        );
+    }
+
+    public get size(): number {
+        return this.workers.length;
+    }
+
+    private route(
+        proxy: string,
+        sourceAddress: string | undefined,
+        disableTlsVerification: boolean,
+        innertubeContext: any,
+    ): PoolWorker {
+        const { key } = SessionManager.getCacheSpec(
+            proxy,
+            sourceAddress,
+            disableTlsVerification,
+            innertubeContext,
+        );
+        return this.workers[hashKey(key) % this.workers.length]!;
+    }
+
+    private broadcast<T>(method: WorkerRequest["method"]): Promise<T[]> {
+        return Promise.all(
+            this.workers.map((worker) => worker.call<T>(method, [])),
+        );
+    }
+
+    public generatePoToken(
+        ...args: Parameters<SessionManager["generatePoToken"]>
+    ): Promise<YoutubeSessionData> {
+        const [, proxy = "", , sourceAddress, disableTlsVerification = false] =
+            args;
+        return this.route(
+            proxy,
+            sourceAddress,
+            disableTlsVerification,
+            args[7],
+        ).call("generatePoToken", args);
+    }
+
+    public generatePoTokens(
+        ...args: Parameters<SessionManager["generatePoTokens"]>
+    ): Promise<(YoutubeSessionData | BatchError)[]> {
+        const [, proxy = "", , sourceAddress, disableTlsVerification = false] =
+            args;
+        return this.route(
+            proxy,
+            sourceAddress,
+            disableTlsVerification,
+            args[7],
+        ).call("generatePoTokens", args);
+    }
+
+    public warmup(
+        ...args: Parameters<SessionManager["warmup"]>
+    ): Promise<MinterInfo> {
+        const [proxy = "", sourceAddress, disableTlsVerification = false] =
+            args;
+        return this.route(
+            proxy,
+            sourceAddress,
+            disableTlsVerification,
+            args[4],
+        ).call("warmup", args);
+    }
+
+    public async invalidateCaches() {
+        await this.broadcast("invalidateCaches");
+    }
+
+    public async invalidateIT() {
+        await this.broadcast("invalidateIT");
+    }
+
+    public async cleanupCaches() {
+        await this.broadcast("cleanupCaches");
+    }
+
+    public async refreshExpiring(): Promise<number> {
+        const refreshed = await this.broadcast<number>("refreshExpiring");
+        return refreshed.reduce((total, count) => total + count, 0);
+    }
+
+    public async minterCacheKeys(): Promise<string[]> {
+        return (await this.broadcast<string[]>("minterCacheKeys")).flat();
+    }
+
+    public async minterPoolSizes(): Promise<PoolSizes> {
+        // the minters of an egress may be spread over several workers
+        const poolSizes: PoolSizes = {};
+        for (const sizes of await this.broadcast<PoolSizes>("minterPoolSizes"))
+            for (const [egress, size] of Object.entries(sizes))
+                poolSizes[egress] = (poolSizes[egress] || 0) + size;
+        return poolSizes;
+    }
+
+    public async cacheStats(): Promise<SessionCacheStats> {
+        const stats = await this.broadcast<SessionCacheStats>("cacheStats");
+        const tokens = stats.flatMap(({ tokens }) => (tokens ? [tokens] : []));
+        return {
+            tokens: tokens.length ? mergeCacheStats(tokens) : null,
+            minters: mergeCacheStats(stats.map(({ minters }) => minters)),
+        };
+    }
+
+    public metrics(): Promise<MetricsSnapshot[]> {
+        return this.broadcast<MetricsSnapshot>("metrics");
+    }
+
+    public async close() {
+        await Promise.all(this.workers.map((worker) => worker.close()));
+    }
+}